@@ -0,0 +1,179 @@
+# Benchmark the Q_n queries from queries.py.
+#
+# `run` measures every query with EXPLAIN (ANALYZE, FORMAT JSON): a few
+# warm-up runs are discarded, then the planning and execution time of N
+# repetitions are summarised and written to a JSON report together with the
+# raw samples. `compare` checks two reports against each other with a
+# Mann-Whitney U test, so a change in median only counts as a regression
+# when it is also statistically significant.
+#
+#   python benchmark.py run --repetitions 30 --output before.json
+#   python benchmark.py compare before.json after.json
+
+import argparse
+import json
+import math
+import statistics
+import sys
+from datetime import datetime, timezone
+
+import psycopg
+
+from queries import QUERIES, db_host, db_password, db_port, db_username, root_database_name
+
+METRICS = ["planning", "execution"]
+
+
+# Run the query once under EXPLAIN ANALYZE and return its planning and
+# execution time in ms.
+def explain_times(cursor, query, params=None):
+    cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {query}", params)
+    plan = cursor.fetchone()[0][0]
+    return plan["Planning Time"], plan["Execution Time"]
+
+
+def measure_query(cursor, query, warmup=3, repetitions=30, params=None):
+    for _ in range(warmup):
+        explain_times(cursor, query, params)
+    samples = {metric: [] for metric in METRICS}
+    for _ in range(repetitions):
+        planning_time, execution_time = explain_times(cursor, query, params)
+        samples["planning"].append(planning_time)
+        samples["execution"].append(execution_time)
+    return samples
+
+
+# Percentile with linear interpolation between the closest ranks
+def percentile(values, fraction):
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values):
+    return {
+        "min": min(values),
+        "median": statistics.median(values),
+        "p95": percentile(values, 0.95),
+        "mean": statistics.fmean(values),
+        "stddev": statistics.stdev(values) if len(values) > 1 else 0.0,
+        "samples": values,
+    }
+
+
+def run_benchmark(conn, queries, warmup, repetitions):
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "server_version": conn.info.server_version,
+        "warmup": warmup,
+        "repetitions": repetitions,
+        "queries": {},
+    }
+    with conn.cursor() as cursor:
+        for i in queries:
+            samples = measure_query(cursor, QUERIES[i], warmup, repetitions)
+            report["queries"][f"Q_{i}"] = {metric: summarize(samples[metric]) for metric in METRICS}
+            conn.rollback()
+            execution = report["queries"][f"Q_{i}"]["execution"]
+            print(f"Q_{i}: median {execution['median']:.3f} ms, p95 {execution['p95']:.3f} ms, "
+                  f"stddev {execution['stddev']:.3f} ms")
+    return report
+
+
+# Two-sided Mann-Whitney U test using the normal approximation with a tie
+# correction. Returns the p-value.
+def mann_whitney_u(a, b):
+    n1, n2 = len(a), len(b)
+    combined = sorted([(value, 0) for value in a] + [(value, 1) for value in b])
+
+    # Average ranks over ties
+    ranks = [0.0] * len(combined)
+    tie_term = 0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        tied = j - i + 1
+        tie_term += tied ** 3 - tied
+        i = j + 1
+
+    rank_sum = sum(rank for rank, (_, group) in zip(ranks, combined) if group == 0)
+    u = rank_sum - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - n1 * n2 / 2) / math.sqrt(variance)
+    return 2 * (1 - statistics.NormalDist().cdf(abs(z)))
+
+
+# Compare the metric medians of two reports. A query regresses when its
+# median grew by more than `threshold` and the difference is significant at
+# `alpha`. Returns True when any query regressed.
+def compare_reports(baseline, candidate, alpha, threshold):
+    regressed = False
+    print(f"{'query':<6} {'metric':<10} {'baseline':>12} {'candidate':>12} {'change':>9} {'p-value':>9}  verdict")
+    for name, before in baseline["queries"].items():
+        after = candidate["queries"].get(name)
+        if after is None:
+            print(f"{name:<6} missing from candidate report")
+            continue
+        for metric in METRICS:
+            old, new = before[metric], after[metric]
+            change = (new["median"] - old["median"]) / old["median"] if old["median"] else 0.0
+            p_value = mann_whitney_u(old["samples"], new["samples"])
+            verdict = "no change"
+            if p_value < alpha and abs(change) > threshold:
+                verdict = "REGRESSION" if change > 0 else "improvement"
+                regressed = regressed or change > 0
+            print(f"{name:<6} {metric:<10} {old['median']:>10.3f}ms {new['median']:>10.3f}ms "
+                  f"{change:>+8.1%} {p_value:>9.4f}  {verdict}")
+    return regressed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the Q_n queries from queries.py.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="measure the queries and write a JSON report")
+    run_parser.add_argument("--database", default=root_database_name,
+                            help=f"database to run the queries against (default: {root_database_name})")
+    run_parser.add_argument("--queries", type=int, nargs="+", default=list(QUERIES),
+                            help="query numbers to run (default: all)")
+    run_parser.add_argument("--warmup", type=int, default=3,
+                            help="discarded runs before measuring (default: 3)")
+    run_parser.add_argument("--repetitions", type=int, default=30,
+                            help="measured runs per query (default: 30)")
+    run_parser.add_argument("--output", default="benchmark.json",
+                            help="report file (default: benchmark.json)")
+
+    compare_parser = subparsers.add_parser("compare", help="compare two reports")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--alpha", type=float, default=0.05,
+                                help="significance level (default: 0.05)")
+    compare_parser.add_argument("--threshold", type=float, default=0.05,
+                                help="relative change in median to report (default: 0.05)")
+    args = parser.parse_args()
+    if args.command == "run" and args.repetitions < 1:
+        parser.error("--repetitions must be at least 1")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "run":
+        with psycopg.connect(dbname=args.database, user=db_username, password=db_password, host=db_host, port=db_port) as conn:
+            report = run_benchmark(conn, args.queries, args.warmup, args.repetitions)
+        with open(args.output, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+        print(f"Wrote {args.output}")
+    else:
+        with open(args.baseline) as baseline_file, open(args.candidate) as candidate_file:
+            regressed = compare_reports(json.load(baseline_file), json.load(candidate_file), args.alpha, args.threshold)
+        sys.exit(1 if regressed else 0)
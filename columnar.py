@@ -0,0 +1,298 @@
+# In-process columnar copy of the loaded tables for batch reporting.
+#
+# `build` reads matches, teams, players, events and the event subtype tables
+# from Postgres once and stores every column as a NumPy array in a directory,
+# one <table>.<column>.npy file per column. Ids are dictionary-encoded into
+# positions: events point at their match and player by row index, the subtype
+# tables at their event, and players at their team, so joins become array
+# indexing. `query` memory-maps the arrays, which makes startup instant, and
+# answers the Q_n leaderboards with vectorized group-bys (np.bincount over the
+# player or team positions). The parameters come from query_registry.py.
+# `check` runs the same leaderboards in SQL and diffs the results.
+#
+#   python columnar.py build --output columnar
+#   python columnar.py query --store columnar --seasons 90 42
+#   python columnar.py check --store columnar
+
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+import psycopg
+
+from queries import QUERIES, db_host, db_password, db_port, db_username, root_database_name
+from query_registry import REGISTRY
+
+# The Q_n leaderboards: the subtype table counted, whether rows are grouped
+# per player or per team, which player a row belongs to (the event's player
+# or the pass recipient), a boolean column filter and the measure.
+LEADERBOARDS = {
+    1: {"table": "shots", "group": "player", "measure": "avg_xg"},
+    2: {"table": "shots", "group": "player"},
+    3: {"table": "shots", "group": "player"},
+    4: {"table": "passes", "group": "team", "flag": "succeeded"},
+    5: {"table": "passes", "group": "player", "player": "recipient"},
+    6: {"table": "shots", "group": "team"},
+    7: {"table": "passes", "group": "player", "flag": "through_ball"},
+    8: {"table": "passes", "group": "team", "flag": "through_ball"},
+    9: {"table": "dribbles", "group": "player"},
+    10: {"table": "dribble_past", "group": "player", "ascending": True},
+}
+
+
+def fetch_columns(cursor, table, columns):
+    cursor.execute(f"SELECT {', '.join(columns)} FROM {table};")
+    rows = cursor.fetchall()
+    if not rows:
+        return [() for _ in columns]
+    return list(zip(*rows))
+
+
+def int_array(values):
+    # NULL ids become -1
+    return np.array([-1 if value is None else value for value in values], dtype=np.int32)
+
+
+# Positions of values in keys, -1 where a value is not a key
+def dictionary_codes(keys, values):
+    if len(keys) == 0:
+        return np.full(len(values), -1, dtype=np.int32)
+    order = np.argsort(keys, kind="stable")
+    positions = np.clip(np.searchsorted(keys, values, sorter=order), 0, len(keys) - 1)
+    codes = order[positions]
+    return np.where(keys[codes] == values, codes, -1).astype(np.int32)
+
+
+def event_codes(event_positions, event_ids):
+    return np.fromiter((event_positions[event_id] for event_id in event_ids), dtype=np.int32, count=len(event_ids))
+
+
+def build_store(conn):
+    store = {}
+    with conn.cursor() as cursor:
+        match_id, competition_id, season_id = fetch_columns(cursor, "matches", ["match_id", "competition_id", "season_id"])
+        store["matches"] = {
+            "match_id": int_array(match_id),
+            "competition_id": int_array(competition_id),
+            "season_id": int_array(season_id),
+        }
+
+        team_id, team_name = fetch_columns(cursor, "teams", ["team_id", "team_name"])
+        store["teams"] = {"team_id": int_array(team_id), "team_name": np.array(team_name, dtype=str)}
+
+        player_id, player_name, team_id = fetch_columns(cursor, "players", ["player_id", "player_name", "team_id"])
+        store["players"] = {
+            "player_id": int_array(player_id),
+            "player_name": np.array(player_name, dtype=str),
+            "team_index": dictionary_codes(store["teams"]["team_id"], int_array(team_id)),
+        }
+
+        event_id, event_type_id, match_id, player_id = fetch_columns(
+            cursor, "events", ["event_id", "event_type_id", "match_id", "player_id"])
+        store["events"] = {
+            "event_type_id": int_array(event_type_id),
+            "match_index": dictionary_codes(store["matches"]["match_id"], int_array(match_id)),
+            "player_index": dictionary_codes(store["players"]["player_id"], int_array(player_id)),
+        }
+        event_positions = {value: i for i, value in enumerate(event_id)}
+        del event_id
+
+        event_id, statsbomb_xg, first_time = fetch_columns(cursor, "shots", ["event_id", "statsbomb_xg", "first_time"])
+        store["shots"] = {
+            "event_index": event_codes(event_positions, event_id),
+            "statsbomb_xg": np.array(statsbomb_xg, dtype=np.float64),
+            "first_time": np.array(first_time, dtype=bool),
+        }
+
+        event_id, recipient_player_id, through_ball, succeeded = fetch_columns(
+            cursor, "passes", ["event_id", "recipient_player_id", "through_ball", "succeeded"])
+        store["passes"] = {
+            "event_index": event_codes(event_positions, event_id),
+            "recipient_index": dictionary_codes(store["players"]["player_id"], int_array(recipient_player_id)),
+            "through_ball": np.array(through_ball, dtype=bool),
+            "succeeded": np.array(succeeded, dtype=bool),
+        }
+
+        event_id, nutmeg, outcome_id = fetch_columns(cursor, "dribbles", ["event_id", "nutmeg", "outcome_id"])
+        store["dribbles"] = {
+            "event_index": event_codes(event_positions, event_id),
+            "nutmeg": np.array(nutmeg, dtype=bool),
+            "outcome_id": int_array(outcome_id),
+        }
+
+        event_id, = fetch_columns(cursor, "dribble_past", ["event_id"])
+        store["dribble_past"] = {"event_index": event_codes(event_positions, event_id)}
+    return store
+
+
+def save_store(store, directory):
+    os.makedirs(directory, exist_ok=True)
+    for table, columns in store.items():
+        for column, values in columns.items():
+            np.save(os.path.join(directory, f"{table}.{column}.npy"), values)
+
+
+def open_store(directory):
+    store = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".npy"):
+            table, column, _ = name.split(".")
+            store.setdefault(table, {})[column] = np.load(os.path.join(directory, name), mmap_mode="r")
+    return store
+
+
+# Answer Q_n from the store. Returns (name, value) rows in the order of the
+# SQL query; rows with the same value may come in a different order.
+def leaderboard(store, i, **overrides):
+    spec = LEADERBOARDS[i]
+    params = REGISTRY[i].params(**overrides)
+    events, matches, players = store["events"], store["matches"], store["players"]
+    rows = store[spec["table"]]
+
+    event_index = rows["event_index"]
+    match_index = events["match_index"][event_index]
+    if spec.get("player") == "recipient":
+        player_index = rows["recipient_index"]
+    else:
+        player_index = events["player_index"][event_index]
+
+    # Events of matches missing from the store have match_index -1, which
+    # would read the last match; look them up at 0 and mask them out
+    mask = match_index >= 0
+    match_index = np.where(mask, match_index, 0)
+    mask &= (matches["competition_id"][match_index] == params["competition_id"])
+    mask &= np.isin(matches["season_id"][match_index], params["season_ids"])
+    mask &= player_index >= 0
+    if "flag" in spec:
+        mask &= rows[spec["flag"]]
+    if "min_xg" in params:
+        mask &= rows["statsbomb_xg"] > params["min_xg"]
+
+    if spec["group"] == "team":
+        codes = players["team_index"][player_index[mask]]
+        names = store["teams"]["team_name"]
+    else:
+        codes = player_index[mask]
+        names = players["player_name"]
+
+    counts = np.bincount(codes, minlength=len(names))
+    if spec.get("measure") == "avg_xg":
+        sums = np.bincount(codes, weights=rows["statsbomb_xg"][mask], minlength=len(names))
+        values = sums / np.maximum(counts, 1)
+    else:
+        values = counts
+
+    groups = np.flatnonzero(counts > params.get("min_count", 0))
+    order = np.argsort(values[groups], kind="stable")
+    if not spec.get("ascending"):
+        order = order[::-1]
+    groups = groups[order]
+    return [(str(names[group]), values[group].item()) for group in groups]
+
+
+# Differences between the engine's and the SQL rows of one query
+def compare_results(engine_rows, sql_rows, tolerance=1e-9):
+    expected = {name: float(value) for name, value in sql_rows}
+    actual = dict(engine_rows)
+    problems = []
+    for name in sorted(set(expected) | set(actual)):
+        if name not in actual:
+            problems.append(f"missing {name}")
+        elif name not in expected:
+            problems.append(f"extra {name}")
+        elif not math.isclose(actual[name], expected[name], rel_tol=tolerance, abs_tol=tolerance):
+            problems.append(f"{name}: {actual[name]} != {expected[name]}")
+    # Same values in the same order; ties may be listed in any order
+    if not problems:
+        for position, ((_, value), (_, expected_value)) in enumerate(zip(engine_rows, sql_rows)):
+            if not math.isclose(value, float(expected_value), rel_tol=tolerance, abs_tol=tolerance):
+                problems.append(f"row {position + 1} out of order: {value} != {expected_value}")
+                break
+    return problems
+
+
+def check_store(store, conn, queries, **overrides):
+    mismatched = []
+    with conn.cursor() as cursor:
+        for i in queries:
+            # The Q_n text itself with the default parameters
+            if any(value is not None for value in overrides.values()):
+                cursor.execute(REGISTRY[i].sql, REGISTRY[i].params(**overrides))
+            else:
+                cursor.execute(QUERIES[i])
+            sql_rows = cursor.fetchall()
+            conn.rollback()
+            problems = compare_results(leaderboard(store, i, **overrides), sql_rows)
+            print(f"Q_{i}: {'OK' if not problems else 'MISMATCH'} ({len(sql_rows)} rows)")
+            for problem in problems[:10]:
+                print(f"    {problem}")
+            if problems:
+                mismatched.append(f"Q_{i}")
+    return mismatched
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Columnar in-process engine for the Q_n leaderboards.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="copy the tables from Postgres into a column store")
+    build_parser.add_argument("--database", default=root_database_name,
+                              help=f"database to read from (default: {root_database_name})")
+    build_parser.add_argument("--output", default="columnar",
+                              help="directory the column files are written to (default: columnar)")
+
+    for name, help_text in [("query", "answer the leaderboards from a column store"),
+                            ("check", "diff the column store's leaderboards against SQL")]:
+        command_parser = subparsers.add_parser(name, help=help_text)
+        command_parser.add_argument("--store", default="columnar",
+                                    help="directory of the column store (default: columnar)")
+        command_parser.add_argument("--queries", type=int, nargs="+", default=list(LEADERBOARDS),
+                                    help="query numbers to run (default: all)")
+        command_parser.add_argument("--competition", type=int,
+                                    help="competition_id for every query (default: the one of each Q_n)")
+        command_parser.add_argument("--seasons", type=int, nargs="+",
+                                    help="season_ids for every query (default: the ones of each Q_n)")
+        command_parser.add_argument("--min-count", type=int,
+                                    help="only list rows whose count is above this (default: 0)")
+        command_parser.add_argument("--min-xg", type=float,
+                                    help="only average shots with an xG above this in Q_1 (default: 0)")
+        if name == "query":
+            command_parser.add_argument("--top", type=int, default=5,
+                                        help="rows printed per query (default: 5)")
+        else:
+            command_parser.add_argument("--database", default=root_database_name,
+                                        help=f"database to run the SQL against (default: {root_database_name})")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "build":
+        start = time.perf_counter()
+        with psycopg.connect(dbname=args.database, user=db_username, password=db_password, host=db_host, port=db_port) as conn:
+            store = build_store(conn)
+        save_store(store, args.output)
+        print(f"Wrote {sum(len(columns) for columns in store.values())} columns to {args.output} "
+              f"in {time.perf_counter() - start:.1f} s")
+        sys.exit(0)
+
+    overrides = {"competition_id": args.competition, "season_ids": args.seasons,
+                 "min_count": args.min_count, "min_xg": args.min_xg}
+    store = open_store(args.store)
+    if args.command == "query":
+        for i in args.queries:
+            start = time.perf_counter()
+            rows = leaderboard(store, i, **overrides)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"Q_{i}: {len(rows)} rows in {elapsed:.3f} ms")
+            for name, value in rows[:args.top]:
+                print(f"    {name}: {value}")
+    else:
+        with psycopg.connect(dbname=args.database, user=db_username, password=db_password, host=db_host, port=db_port) as conn:
+            mismatched = check_store(store, conn, args.queries, **overrides)
+        if mismatched:
+            print(f"Results differ for: {', '.join(mismatched)}")
+        sys.exit(1 if mismatched else 0)
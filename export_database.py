@@ -0,0 +1,62 @@
+# Export project_database for queries.py.
+#
+# The default directory format is compressed and written by parallel pg_dump
+# workers, and queries.py restores it with pg_restore -j. A plain SQL dump
+# (the original dbexport.sql) can still be produced with --format plain.
+# Every export is written together with a sha256sum-style checksum file.
+
+import argparse
+import os
+import shutil
+import subprocess
+
+from queries import db_host, db_password, db_port, db_username, dir_path, root_database_name, write_dump_checksums
+
+EXPORT_PATHS = {
+    "plain": os.path.join(dir_path, "dbexport.sql"),
+    "custom": os.path.join(dir_path, "dbexport.dump"),
+    "directory": os.path.join(dir_path, "dbexport.dir"),
+}
+PG_DUMP_FORMATS = {"plain": "p", "custom": "c", "directory": "d"}
+
+
+def export_database(export_format, jobs, compression):
+    path = EXPORT_PATHS[export_format]
+    # pg_dump refuses to write a directory export into a non-empty directory
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+
+    command = [
+        "pg_dump",
+        "-h", db_host,
+        "-p", db_port,
+        "-U", db_username,
+        "-d", root_database_name,
+        "-F", PG_DUMP_FORMATS[export_format],
+        "-f", path,
+    ]
+    if export_format != "plain":
+        command += ["-Z", str(compression)]
+    if export_format == "directory":
+        command += ["-j", str(jobs)]
+
+    env = {**os.environ, 'PGPASSWORD': db_password}
+    subprocess.run(command, check=True, env=env)
+    checksum_path = write_dump_checksums(path)
+    print(f"Exported {root_database_name} to {path} (checksums in {checksum_path})")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=f"Export {root_database_name} for queries.py.")
+    parser.add_argument("--format", choices=list(EXPORT_PATHS), default="directory",
+                        help="pg_dump output format (default: directory)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="parallel pg_dump workers, directory format only (default: CPU count)")
+    parser.add_argument("--compression", type=int, default=6,
+                        help="compression level for the custom and directory formats (default: 6)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    export_database(args.format, args.jobs, args.compression)
@@ -0,0 +1,193 @@
+# Look up the 360 freeze frames loaded by `import_data.py --three-sixty`, and
+# benchmark their packed storage against one row per player.
+#
+# freeze_frames keeps one row per event: the player locations packed into a
+# REAL[] of x, y pairs and bitmasks marking the teammates, the actor and the
+# keepers (see rows.freeze_frame_rows). `benchmark` builds the naive layout,
+# freeze_frame_players with one row per player in a frame, from it in SQL,
+# compares the size of both tables, and times fetching the frames of random
+# batches of events from each. Both lookups must return the same frames.
+#
+#   python freeze_frames.py lookup 5f1ab9a4-... 8c0e3ba2-...
+#   python freeze_frames.py benchmark --batch-sizes 1 100 1000 --repetitions 20
+
+import argparse
+import json
+import statistics
+import sys
+import time
+
+import psycopg
+
+from queries import db_host, db_password, db_port, db_username, root_database_name
+
+
+# Type of the event_id column, character varying or uuid in the compact schema
+def event_id_type(cursor):
+    cursor.execute(
+        "SELECT format_type(atttypid, NULL) FROM pg_attribute "
+        "WHERE attrelid = 'freeze_frames'::regclass AND attname = 'event_id';"
+    )
+    return cursor.fetchone()[0]
+
+
+def unpack_frame(teammate_mask, actor_mask, keeper_mask, locations):
+    return [
+        {
+            "teammate": bool(teammate_mask >> i & 1),
+            "actor": bool(actor_mask >> i & 1),
+            "keeper": bool(keeper_mask >> i & 1),
+            "location": [locations[2 * i], locations[2 * i + 1]],
+        }
+        for i in range(len(locations) // 2)
+    ]
+
+
+# The freeze frames of the given events, as {event_id: [player, ...]} with
+# the players in the shape of the 360 files. Events without a frame are left
+# out.
+def freeze_frames(cursor, event_ids):
+    cursor.execute(
+        "SELECT event_id::text, teammate_mask, actor_mask, keeper_mask, locations FROM freeze_frames "
+        f"WHERE event_id = ANY(%s::{event_id_type(cursor)}[]);",
+        (list(event_ids),)
+    )
+    return {event_id: unpack_frame(teammate_mask, actor_mask, keeper_mask, locations)
+            for event_id, teammate_mask, actor_mask, keeper_mask, locations in cursor.fetchall()}
+
+
+def create_player_table(cursor):
+    id_type = event_id_type(cursor)
+    cursor.execute("DROP TABLE IF EXISTS freeze_frame_players;")
+    cursor.execute(
+        f"""CREATE TABLE freeze_frame_players (
+            event_id {id_type},
+            player_index SMALLINT,
+            x REAL NOT NULL,
+            y REAL NOT NULL,
+            teammate BOOLEAN NOT NULL,
+            actor BOOLEAN NOT NULL,
+            keeper BOOLEAN NOT NULL,
+            PRIMARY KEY (event_id, player_index)
+        );"""
+    )
+    cursor.execute(
+        """INSERT INTO freeze_frame_players
+        SELECT event_id, i - 1, locations[2 * i - 1], locations[2 * i],
+            (teammate_mask >> (i - 1)) & 1 = 1, (actor_mask >> (i - 1)) & 1 = 1, (keeper_mask >> (i - 1)) & 1 = 1
+        FROM freeze_frames, generate_series(1, array_length(locations, 1) / 2) AS i;"""
+    )
+    cursor.execute("ANALYZE freeze_frames;")
+    cursor.execute("ANALYZE freeze_frame_players;")
+
+
+# The same lookup as freeze_frames, from freeze_frame_players
+def player_row_frames(cursor, event_ids):
+    cursor.execute(
+        "SELECT event_id::text, x, y, teammate, actor, keeper FROM freeze_frame_players "
+        f"WHERE event_id = ANY(%s::{event_id_type(cursor)}[]) ORDER BY event_id, player_index;",
+        (list(event_ids),)
+    )
+    frames = {}
+    for event_id, x, y, teammate, actor, keeper in cursor.fetchall():
+        frames.setdefault(event_id, []).append(
+            {"teammate": teammate, "actor": actor, "keeper": keeper, "location": [x, y]})
+    return frames
+
+
+def relation_size(cursor, table):
+    cursor.execute("SELECT pg_total_relation_size(%s::regclass);", (table,))
+    return cursor.fetchone()[0]
+
+
+# Median milliseconds to fetch the frames of random batches of events from
+# both layouts, per batch size
+def time_lookups(cursor, batch_sizes, repetitions):
+    lookups = {"packed": freeze_frames, "player_rows": player_row_frames}
+    latencies = {}
+    for batch_size in batch_sizes:
+        samples = {layout: [] for layout in lookups}
+        for _ in range(repetitions):
+            cursor.execute("SELECT event_id::text FROM freeze_frames ORDER BY random() LIMIT %s;", (batch_size,))
+            event_ids = [row[0] for row in cursor.fetchall()]
+            results = {}
+            for layout, lookup in lookups.items():
+                start = time.perf_counter()
+                results[layout] = lookup(cursor, event_ids)
+                samples[layout].append((time.perf_counter() - start) * 1000)
+            if results["packed"] != results["player_rows"]:
+                raise ValueError(f"The layouts returned different frames for {event_ids}")
+        latencies[batch_size] = {layout: statistics.median(values) for layout, values in samples.items()}
+    return latencies
+
+
+def run_benchmark(conn, batch_sizes, repetitions, keep=False):
+    with conn.cursor() as cursor:
+        start = time.perf_counter()
+        create_player_table(cursor)
+        conn.commit()
+        build_time = time.perf_counter() - start
+        cursor.execute("SELECT COUNT(*) FROM freeze_frames;")
+        frames = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(*) FROM freeze_frame_players;")
+        players = cursor.fetchone()[0]
+        report = {
+            "frames": frames,
+            "players": players,
+            "player_table_build_seconds": build_time,
+            "bytes": {"packed": relation_size(cursor, "freeze_frames"),
+                      "player_rows": relation_size(cursor, "freeze_frame_players")},
+            "latencies_ms": time_lookups(cursor, batch_sizes, repetitions),
+        }
+        if not keep:
+            cursor.execute("DROP TABLE freeze_frame_players;")
+            conn.commit()
+    return report
+
+
+def print_report(report):
+    print(f"{report['frames']} frames, {report['players']} players")
+    packed, player_rows = report["bytes"]["packed"], report["bytes"]["player_rows"]
+    print(f"Size: packed {packed / 1024:.0f}kB, row per player {player_rows / 1024:.0f}kB "
+          f"({player_rows / packed if packed else 0:.1f}x)")
+    print(f"{'events':>8} {'packed':>12} {'row/player':>12}")
+    for batch_size, latencies in report["latencies_ms"].items():
+        print(f"{batch_size:>8} {latencies['packed']:>10.3f}ms {latencies['player_rows']:>10.3f}ms")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Look up and benchmark the 360 freeze frames.")
+    parser.add_argument("--database", default=root_database_name,
+                        help=f"database to use (default: {root_database_name})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    lookup_parser = subparsers.add_parser("lookup", help="print the freeze frames of events as JSON")
+    lookup_parser.add_argument("event_ids", nargs="+",
+                               help="event ids to look up")
+
+    benchmark_parser = subparsers.add_parser("benchmark", help="compare packed frames with one row per player")
+    benchmark_parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 100, 1000],
+                                  help="number of events fetched per lookup (default: 1 100 1000)")
+    benchmark_parser.add_argument("--repetitions", type=int, default=20,
+                                  help="lookups per batch size (default: 20)")
+    benchmark_parser.add_argument("--output",
+                                  help="also write the report to this JSON file")
+    benchmark_parser.add_argument("--keep", action="store_true",
+                                  help="keep the freeze_frame_players table afterwards")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    with psycopg.connect(dbname=args.database, user=db_username, password=db_password, host=db_host, port=db_port) as conn:
+        if args.command == "lookup":
+            with conn.cursor() as cursor:
+                json.dump(freeze_frames(cursor, args.event_ids), sys.stdout, indent=2)
+            print()
+            sys.exit(0)
+        report = run_benchmark(conn, args.batch_sizes, args.repetitions, args.keep)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+        print(f"Wrote {args.output}")
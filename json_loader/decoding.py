@@ -0,0 +1,87 @@
+# Selective, typed decoding of the StatsBomb event and lineup files, used
+# with `import_data.py --typed-decoding`.
+#
+# The types below declare only the fields rows.py reads. msgspec decodes a
+# file straight into them: every other field (locations, related events,
+# tactics, freeze frames, ...) is skipped without building Python objects,
+# and the fields that are kept are checked against their types. The records
+# are plain dicts, so rows.event_rows and rows.lineup_rows work on them
+# unchanged. Without msgspec installed, files are decoded with json.load.
+import json
+from typing import List, Optional, TypedDict
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+class Ref(TypedDict):
+    id: int
+
+
+class Shot(TypedDict, total=False):
+    statsbomb_xg: Optional[float]
+    first_time: Optional[bool]
+    end_location: List[float]
+
+
+Pass = TypedDict("Pass", {
+    "recipient": Optional[Ref],
+    "through_ball": Optional[bool],
+    "outcome": Optional[Ref],
+    "end_location": List[float],
+}, total=False)
+
+
+class Dribble(TypedDict, total=False):
+    nutmeg: Optional[bool]
+    outcome: Ref
+
+
+# "pass" is a keyword, so the optional fields use the functional syntax
+OptionalEventFields = TypedDict("OptionalEventFields", {
+    "player": Optional[Ref],
+    "location": Optional[List[float]],
+    "shot": Shot,
+    "pass": Pass,
+    "dribble": Dribble,
+}, total=False)
+
+
+class Event(OptionalEventFields):
+    id: str
+    type: Ref
+
+
+class LineupPlayer(TypedDict):
+    player_id: int
+    player_name: str
+
+
+class Lineup(TypedDict):
+    team_id: int
+    lineup: List[LineupPlayer]
+
+
+if msgspec is not None:
+    EVENT_DECODER = msgspec.json.Decoder(List[Event])
+    LINEUP_DECODER = msgspec.json.Decoder(List[Lineup])
+else:
+    EVENT_DECODER = LINEUP_DECODER = None
+
+
+def typed_decoding_available():
+    return msgspec is not None
+
+
+def decode_events(json_file):
+    if EVENT_DECODER is None:
+        return json.load(json_file)
+    return EVENT_DECODER.decode(json_file.read())
+
+
+def decode_lineups(json_file):
+    if LINEUP_DECODER is None:
+        return json.load(json_file)
+    return LINEUP_DECODER.decode(json_file.read())
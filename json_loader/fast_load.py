@@ -0,0 +1,134 @@
+# Fast-load mode for a fresh database, used by `import_data.py --fast-load`.
+#
+# Right after create_tables, defer_constraints records the primary key,
+# unique and foreign key constraints of the loader's tables, drops them and
+# makes the tables UNLOGGED, so the load itself maintains no indexes, checks
+# no foreign keys and writes no WAL. Once the data is in, find_violations
+# checks every deferred constraint against the loaded rows with one query
+# each, still inside the load transaction. Violations are printed and abort
+# the load, like the first failing row would on the constrained path.
+# Otherwise the load is committed and restore_constraints sets the tables
+# LOGGED again, which rewrites them, while they have no indexes yet. It then
+# adds the keys back, one connection per table in parallel, and finally the
+# foreign keys one after the other.
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg
+
+from queries import db_host, db_password, db_port, db_username, root_database_name
+
+def table_constraints(cur, tables):
+    cur.execute(
+        """SELECT c.conname, c.contype, t.relname,
+            ARRAY(SELECT a.attname FROM unnest(c.conkey) WITH ORDINALITY AS k(attnum, n)
+                  JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = k.attnum ORDER BY k.n),
+            f.relname,
+            ARRAY(SELECT a.attname FROM unnest(c.confkey) WITH ORDINALITY AS k(attnum, n)
+                  JOIN pg_attribute a ON a.attrelid = c.confrelid AND a.attnum = k.attnum ORDER BY k.n),
+            pg_get_constraintdef(c.oid)
+        FROM pg_constraint c
+        JOIN pg_class t ON t.oid = c.conrelid
+        LEFT JOIN pg_class f ON f.oid = c.confrelid
+        WHERE c.contype IN ('p', 'u', 'f')
+            AND t.relnamespace = 'public'::regnamespace
+            AND t.relname = ANY(%s)
+        ORDER BY c.conname;""",
+        (list(tables),)
+    )
+    return [
+        {"name": name, "type": contype, "table": table, "columns": columns,
+         "referenced_table": referenced_table, "referenced_columns": referenced_columns, "definition": definition}
+        for name, contype, table, columns, referenced_table, referenced_columns, definition in cur.fetchall()
+    ]
+
+
+# Drop the constraints of the tables and make them UNLOGGED. Returns the
+# dropped constraints for find_violations and restore_constraints.
+def defer_constraints(conn, tables):
+    with conn.cursor() as cur:
+        constraints = table_constraints(cur, tables)
+        # Foreign keys first, they depend on the referenced keys
+        for constraint in sorted(constraints, key=lambda constraint: constraint["type"] != "f"):
+            cur.execute(f"ALTER TABLE {constraint['table']} DROP CONSTRAINT {constraint['name']};")
+        for table in reversed(list(tables)):
+            cur.execute(f"ALTER TABLE {table} SET UNLOGGED;")
+    return constraints
+
+
+def violation_query(constraint):
+    table, columns = constraint["table"], constraint["columns"]
+    column_list = ", ".join(columns)
+    if constraint["type"] == "f":
+        # MATCH SIMPLE: rows with a NULL in the key are not checked
+        referenced = constraint["referenced_table"]
+        join = " AND ".join(f"{referenced}.{parent} = {table}.{child}"
+                            for child, parent in zip(columns, constraint["referenced_columns"]))
+        not_null = " AND ".join(f"{table}.{column} IS NOT NULL" for column in columns)
+        return (f"SELECT DISTINCT {', '.join(f'{table}.{column}' for column in columns)} FROM {table} "
+                f"WHERE {not_null} AND NOT EXISTS (SELECT 1 FROM {referenced} WHERE {join})")
+    if constraint["type"] == "p":
+        # A primary key also rules out NULLs
+        null_keys = " OR ".join(f"{column} IS NULL" for column in columns)
+        return (f"SELECT {column_list} FROM {table} GROUP BY {column_list} "
+                f"HAVING COUNT(*) > 1 OR bool_or({null_keys})")
+    # UNIQUE lets any number of rows with a NULL in the key through
+    not_null = " AND ".join(f"{column} IS NOT NULL" for column in columns)
+    return f"SELECT {column_list} FROM {table} WHERE {not_null} GROUP BY {column_list} HAVING COUNT(*) > 1"
+
+
+# Keys that would violate the deferred constraints, as a list of
+# (constraint, number of offending keys, a few of them)
+def find_violations(conn, constraints, examples=5):
+    violations = []
+    with conn.cursor() as cur:
+        for constraint in constraints:
+            query = violation_query(constraint)
+            cur.execute(f"SELECT COUNT(*) FROM ({query}) AS violations;")
+            count = cur.fetchone()[0]
+            if count:
+                cur.execute(f"{query} LIMIT {examples};")
+                violations.append((constraint, count, cur.fetchall()))
+    return violations
+
+
+def print_violations(violations):
+    print(f"Fast load found {len(violations)} constraint violations, nothing was committed:")
+    for constraint, count, keys in violations:
+        kind = "keys without a referenced row" if constraint["type"] == "f" else "duplicate or NULL keys"
+        print(f"    {constraint['table']}.{constraint['name']} {constraint['definition']}: {count} {kind}, "
+              f"e.g. {', '.join(str(key) for key in keys)}")
+
+
+def run_on_connection(statements):
+    with psycopg.connect(dbname=root_database_name, user=db_username, password=db_password,
+                         host=db_host, port=db_port, autocommit=True) as conn:
+        for statement in statements:
+            conn.execute(statement)
+
+
+# One job per table. ADD PRIMARY KEY and ADD UNIQUE only lock their own
+# table, so the jobs do not wait on each other.
+def run_per_table(constraints, jobs):
+    statements = {}
+    for constraint in constraints:
+        statements.setdefault(constraint["table"], []).append(
+            f"ALTER TABLE {constraint['table']} ADD CONSTRAINT {constraint['name']} {constraint['definition']};")
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for future in [executor.submit(run_on_connection, table_statements) for table_statements in statements.values()]:
+            future.result()
+
+
+# Runs after the load was committed
+def restore_constraints(constraints, tables, jobs=4):
+    # SET LOGGED rewrites the table and its indexes, so it goes before the
+    # keys are built. Parents first, as a logged table cannot reference an
+    # unlogged one.
+    run_on_connection([f"ALTER TABLE {table} SET LOGGED;" for table in tables])
+    run_per_table([constraint for constraint in constraints if constraint["type"] != "f"], jobs)
+    # ADD FOREIGN KEY takes a SHARE ROW EXCLUSIVE lock on the referenced table
+    # too, which conflicts with itself. Most foreign keys reference events,
+    # so parallel jobs would mostly queue up behind each other.
+    run_on_connection([
+        f"ALTER TABLE {constraint['table']} ADD CONSTRAINT {constraint['name']} {constraint['definition']};"
+        for constraint in constraints if constraint["type"] == "f"
+    ])
@@ -1,17 +1,31 @@
 import psycopg
+import argparse
 import json
+import multiprocessing
 import sys
 import os
+from collections import deque
+from functools import partial
 # Do some directory hacking to import values from queries.py
 directory = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
 sys.path.append(directory)
 from queries import db_host, db_password, db_port, db_username, root_database_name
+from decoding import typed_decoding_available
+from fast_load import defer_constraints, find_violations, print_violations, restore_constraints
+from index_advisor import DEFAULT_INDEX_FILE, create_indexes
+from instrumentation import LoadReport, table_sizes
+from manifest import Checkpoints, Manifest, create_manifest_table
+from pitch_zones import create_location_indexes
+from post_load import post_load
+from rows import competition_rows, event_file_rows, lineup_file_rows, match_rows, three_sixty_file_rows
+from stats_cube import create_stats_cube, refresh_stats_cube
+from writers import PARTITIONED_TABLES, TABLES, CopyWriter, InsertWriter, schema_tables
 
-def ensure_database_exists(conn):
+def ensure_database_exists(conn, database_name=root_database_name):
     with conn.cursor() as cur:
-        cur.execute(f"DROP DATABASE IF EXISTS {root_database_name};")
+        cur.execute(f"DROP DATABASE IF EXISTS {database_name};")
         cur.execute(f"""
-            CREATE DATABASE {root_database_name}
+            CREATE DATABASE {database_name}
                 WITH
                 OWNER = {db_username}
                 ENCODING = 'UTF8'
@@ -26,11 +40,54 @@ def ensure_database_exists(conn):
         """)
 
 
-def create_tables(conn):
+def database_exists(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM pg_database WHERE datname = %s;", (root_database_name,))
+        return cur.fetchone() is not None
+
+
+def tables_exist(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('public.events') IS NOT NULL;")
+        return cur.fetchone()[0]
+
+
+def create_tables(conn, partitioned=False, compact=False):
+    # The partitioned schema carries the match's competition and season on
+    # events and its subtype tables, includes them in their keys, and
+    # list-partitions the tables by competition and then season, so queries
+    # filtering on them only scan the partitions of those seasons.
+    if partitioned:
+        partition_columns = """
+                competition_id INTEGER NOT NULL,
+                season_id INTEGER NOT NULL,"""
+        partition_key = ", competition_id, season_id"
+        partition_by = " PARTITION BY LIST (competition_id)"
+        match_key = """
+                UNIQUE (match_id, competition_id, season_id),"""
+    else:
+        partition_columns = partition_key = partition_by = match_key = ""
+
+    # The compact schema stores event ids as 16-byte uuids instead of 36
+    # characters of text and xG as real, and puts the integer columns before
+    # the booleans, so rows and key indexes need no alignment padding.
+    if compact:
+        event_id_type = "UUID"
+        xg_type = "REAL"
+        dribble_columns = """
+                outcome_id INTEGER,
+                nutmeg BOOLEAN DEFAULT FALSE NOT NULL,"""
+    else:
+        event_id_type = "VARCHAR(36)"
+        xg_type = "NUMERIC(10,10)"
+        dribble_columns = """
+                nutmeg BOOLEAN DEFAULT FALSE NOT NULL,
+                outcome_id INTEGER,"""
+
     with conn.cursor() as cur:
         # Create competitions table
         cur.execute(
-            """CREATE TABLE competitions (
+            """CREATE TABLE IF NOT EXISTS competitions (
                 competition_id INTEGER,
                 country_name VARCHAR(32) NOT NULL,
                 competition_name VARCHAR(32) NOT NULL,
@@ -38,18 +95,18 @@ def create_tables(conn):
                 competition_youth BOOLEAN,
                 competition_international BOOLEAN,
                 -- match_updated
-                -- match_updated_360
-                -- match_available_360
                 -- match_available
                 PRIMARY KEY (competition_id)
             );"""
         )
         # Create seasons table
         cur.execute(
-            """CREATE TABLE seasons (
+            """CREATE TABLE IF NOT EXISTS seasons (
                 season_id INTEGER,
                 competition_id INTEGER,
                 season_name VARCHAR(32) NOT NULL,
+                match_available_360 TIMESTAMP,
+                match_updated_360 TIMESTAMP,
                 PRIMARY KEY (season_id, competition_id),
                 FOREIGN KEY (competition_id)
 		            REFERENCES competitions (competition_id)
@@ -57,11 +114,11 @@ def create_tables(conn):
         )
         # Create matches table
         cur.execute(
-            """CREATE TABLE matches (
+            f"""CREATE TABLE IF NOT EXISTS matches (
                 match_id INTEGER,
                 season_id INTEGER,
                 competition_id INTEGER,
-                PRIMARY KEY (match_id),
+                PRIMARY KEY (match_id),{match_key}
                 FOREIGN KEY (competition_id)
 		            REFERENCES competitions (competition_id),
                 FOREIGN KEY (season_id, competition_id)
@@ -70,7 +127,7 @@ def create_tables(conn):
         )
         # Create teams table
         cur.execute(
-            """CREATE TABLE teams (
+            """CREATE TABLE IF NOT EXISTS teams (
                 team_id INTEGER,
                 team_name VARCHAR(64) UNIQUE NOT NULL,
                 PRIMARY KEY (team_id)
@@ -78,7 +135,7 @@ def create_tables(conn):
         )
         # Create players table
         cur.execute(
-            """CREATE TABLE players (
+            """CREATE TABLE IF NOT EXISTS players (
                 player_id INTEGER,
                 player_name VARCHAR(64) UNIQUE NOT NULL,
                 team_id INTEGER NOT NULL,
@@ -87,240 +144,480 @@ def create_tables(conn):
 		            REFERENCES teams (team_id)
             );"""
         )
-        # Create events table
+        # Create events table. Locations are x, y on the 120 x 80 StatsBomb
+        # pitch, queried by zone through the indexes of pitch_zones.py
         cur.execute(
-            """CREATE TABLE events (
-                event_id VARCHAR(36),
+            f"""CREATE TABLE IF NOT EXISTS events (
+                event_id {event_id_type},
                 event_type_id INTEGER,
                 match_id INTEGER,
                 player_id INTEGER,
-                PRIMARY KEY (event_id),
-                FOREIGN KEY (match_id)
-		            REFERENCES matches (match_id),
+                location_x REAL,
+                location_y REAL,{partition_columns}
+                PRIMARY KEY (event_id{partition_key}),
+                FOREIGN KEY (match_id{partition_key})
+		            REFERENCES matches (match_id{partition_key}),
                 FOREIGN KEY (player_id)
 		            REFERENCES players (player_id)
-            );"""
+            ){partition_by};"""
         )
         # Create shots table
         cur.execute(
-            """CREATE TABLE shots (
-                event_id VARCHAR(36),
-                statsbomb_xg NUMERIC(10,10),
+            f"""CREATE TABLE IF NOT EXISTS shots (
+                event_id {event_id_type},{partition_columns}
+                statsbomb_xg {xg_type},
+                end_location_x REAL,
+                end_location_y REAL,
                 first_time BOOLEAN DEFAULT FALSE NOT NULL,
-                PRIMARY KEY (event_id),
-                FOREIGN KEY (event_id)
-		            REFERENCES events (event_id)
-            );"""
+                PRIMARY KEY (event_id{partition_key}),
+                FOREIGN KEY (event_id{partition_key})
+		            REFERENCES events (event_id{partition_key})
+            ){partition_by};"""
         )
         # Create passes table
         cur.execute(
-            """CREATE TABLE passes (
-                event_id VARCHAR(36),
+            f"""CREATE TABLE IF NOT EXISTS passes (
+                event_id {event_id_type},{partition_columns}
                 recipient_player_id INTEGER,
+                end_location_x REAL,
+                end_location_y REAL,
                 succeeded BOOLEAN DEFAULT TRUE NOT NULL,
                 through_ball BOOLEAN DEFAULT FALSE NOT NULL,
-                PRIMARY KEY (event_id),
-                FOREIGN KEY (event_id)
-		            REFERENCES events (event_id),
+                PRIMARY KEY (event_id{partition_key}),
+                FOREIGN KEY (event_id{partition_key})
+		            REFERENCES events (event_id{partition_key}),
                 FOREIGN KEY (recipient_player_id)
 		            REFERENCES players (player_id)
-            );"""
+            ){partition_by};"""
         )
         # Create dribbles table
         cur.execute(
-            """CREATE TABLE dribbles (
-                event_id VARCHAR(36),
-                nutmeg BOOLEAN DEFAULT FALSE NOT NULL,
-                outcome_id INTEGER,
-                PRIMARY KEY (event_id),
-                FOREIGN KEY (event_id)
-		            REFERENCES events (event_id)
-            );"""
+            f"""CREATE TABLE IF NOT EXISTS dribbles (
+                event_id {event_id_type},{partition_columns}{dribble_columns}
+                PRIMARY KEY (event_id{partition_key}),
+                FOREIGN KEY (event_id{partition_key})
+		            REFERENCES events (event_id{partition_key})
+            ){partition_by};"""
         )
         # Create dribbled past table
         cur.execute(
-            """CREATE TABLE dribble_past (
-                event_id VARCHAR(36),
-                PRIMARY KEY (event_id),
-                FOREIGN KEY (event_id)
-		            REFERENCES events (event_id)
-            );"""
+            f"""CREATE TABLE IF NOT EXISTS dribble_past (
+                event_id {event_id_type},{partition_columns}
+                PRIMARY KEY (event_id{partition_key}),
+                FOREIGN KEY (event_id{partition_key})
+		            REFERENCES events (event_id{partition_key})
+            ){partition_by};"""
+        )
+        # Create 360 freeze frames table, one row per event (see
+        # rows.freeze_frame_rows)
+        cur.execute(
+            f"""CREATE TABLE IF NOT EXISTS freeze_frames (
+                event_id {event_id_type},{partition_columns}
+                teammate_mask INTEGER NOT NULL,
+                actor_mask INTEGER NOT NULL,
+                keeper_mask INTEGER NOT NULL,
+                visible_area REAL[],
+                locations REAL[] NOT NULL,
+                PRIMARY KEY (event_id{partition_key}),
+                FOREIGN KEY (event_id{partition_key})
+		            REFERENCES events (event_id{partition_key})
+            ){partition_by};"""
         )
+        # Rows of seasons without their own partition
+        if partitioned:
+            for table in PARTITIONED_TABLES:
+                cur.execute(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT;")
 
 
+# Columns added to the tables since the first version of the loader
+ADDED_COLUMNS = {
+    "seasons": [("match_available_360", "TIMESTAMP"), ("match_updated_360", "TIMESTAMP")],
+    "events": [("location_x", "REAL"), ("location_y", "REAL")],
+    "shots": [("end_location_x", "REAL"), ("end_location_y", "REAL")],
+    "passes": [("end_location_x", "REAL"), ("end_location_y", "REAL")],
+}
 
-def import_data(conn):
-    cur = conn.cursor()
-    # Import competitions
-    with open("statsbomb-data/data/competitions.json", 'r') as competitions_json_file:
-        competitions_json = json.load(competitions_json_file)
-        for competition in competitions_json:
-            # Insert competition
+
+# Bring a database made by an earlier version of the loader up to the
+# current schema before loading into it, in the layout it already has.
+# Missing tables are created and missing columns added; the rows already
+# stored keep NULL in the new columns until their files are imported again.
+def migrate_tables(conn, partitioned=False, compact=False):
+    create_tables(conn, partitioned, compact)
+    with conn.cursor() as cur:
+        for table, columns in ADDED_COLUMNS.items():
+            for name, column_type in columns:
+                cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {name} {column_type};")
+
+
+# Partitions of the events and subtype tables for one season, created before
+# its rows are loaded: one partition per competition, split per season.
+def create_partitions(conn, competition_id, season_id):
+    with conn.cursor() as cur:
+        for table in PARTITIONED_TABLES:
+            cur.execute(
+                f"CREATE TABLE IF NOT EXISTS {table}_c{competition_id} PARTITION OF {table} "
+                f"FOR VALUES IN ({competition_id}) PARTITION BY LIST (season_id);"
+            )
             cur.execute(
-                "INSERT INTO competitions (competition_id, country_name, competition_name, competition_gender, competition_youth, competition_international) "
-                f"VALUES (%s, %s, %s, %s, %s, %s) "
-                "ON CONFLICT (competition_id) DO NOTHING;",
-                (
-                    competition["competition_id"],
-                    competition["country_name"],
-                    competition["competition_name"],
-                    competition["competition_gender"],
-                    competition["competition_youth"],
-                    competition["competition_international"]
-                )
+                f"CREATE TABLE IF NOT EXISTS {table}_c{competition_id}_default PARTITION OF {table}_c{competition_id} DEFAULT;"
             )
-            # Insert season
             cur.execute(
-                "INSERT INTO seasons (season_id, season_name, competition_id) "
-                f"VALUES (%s, %s, %s);",
-                (
-                    competition["season_id"],
-                    competition["season_name"],
-                    competition["competition_id"],
-                )
+                f"CREATE TABLE IF NOT EXISTS {table}_c{competition_id}_s{season_id} PARTITION OF {table}_c{competition_id} "
+                f"FOR VALUES IN ({season_id});"
             )
 
+
+def events_compact(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT atttypid = 'uuid'::regtype FROM pg_attribute "
+            "WHERE attrelid = to_regclass('public.events') AND attname = 'event_id';"
+        )
+        row = cur.fetchone()
+        return row is not None and row[0]
+
+
+def events_partitioned(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('public.events');")
+        row = cur.fetchone()
+        return row is not None and row[0]
+
+
+# List the (match_id, path) of every per-match file in a directory that
+# belongs to an included match, in match_id order.
+def match_files(directory, included_matches):
+    jobs = []
+    for file_name in os.listdir(directory):
+        match_id = int(os.path.splitext(file_name)[0])
+        if match_id in included_matches:
+            jobs.append((match_id, os.path.join(directory, file_name)))
+    return sorted(jobs)
+
+
+# Runs in a pool worker: parse a whole file into a list of rows that can be
+# shipped back to the writer, with the file's stage timings when profiling.
+def collect_rows(parse, job, profile=False):
+    stats = {} if profile else None
+    return list(parse(job, stats=stats)), stats
+
+
+# Run parse over every job and yield (job, rows, stats) for each file in job
+# order. stats holds the file's stage timings when profiling, else None; in
+# the serial case it is only filled in once its rows have been consumed.
+# With one worker the rows are produced lazily as the writer consumes them.
+# With more, the files are parsed by a process pool; at most a few files per
+# worker are in flight, so a slow writer never lets parsed batches pile up
+# in memory.
+def parse_files(parse, jobs, workers=1, profile=False):
+    if workers <= 1:
+        for job in jobs:
+            stats = {} if profile else None
+            yield job, parse(job, stats=stats), stats
+        return
+
+    with multiprocessing.Pool(workers) as pool:
+        pending = deque()
+        for job in jobs:
+            pending.append((job, pool.apply_async(collect_rows, (parse, job, profile))))
+            if len(pending) >= 2 * workers:
+                job, result = pending.popleft()
+                yield (job, *result.get())
+        while pending:
+            job, result = pending.popleft()
+            yield (job, *result.get())
+
+
+def write_files(writer, files, report=None, checkpoints=None):
+    for job, rows, stats in files:
+        write_before = report.write_time() if report is not None else 0.0
+        for table, row in rows:
+            writer.write(table, row)
+        if report is not None:
+            report.file_done(job, stats, write_before)
+        if checkpoints is not None:
+            checkpoints.file_done(job[1])
+
+
+# Remove the events of the given matches, and their shot/pass/dribble and
+# freeze frame rows, so the matches can be imported again.
+def delete_match_events(cur, match_ids):
+    if not match_ids:
+        return
+    for table in ["freeze_frames", "shots", "passes", "dribbles", "dribble_past"]:
+        delete_event_rows(cur, table, match_ids)
+    cur.execute("DELETE FROM events WHERE match_id = ANY(%s);", (match_ids,))
+
+
+def delete_event_rows(cur, table, match_ids):
+    cur.execute(
+        f"DELETE FROM {table} WHERE event_id IN "
+        "(SELECT event_id FROM events WHERE match_id = ANY(%s));",
+        (match_ids,)
+    )
+
+
+# The given matches that have events but no freeze frames
+def matches_without_frames(cur, match_ids):
+    cur.execute(
+        """SELECT match_id FROM unnest(%s::integer[]) AS matches (match_id)
+        WHERE EXISTS (SELECT 1 FROM events WHERE events.match_id = matches.match_id)
+            AND NOT EXISTS (SELECT 1 FROM events
+                            JOIN freeze_frames ON freeze_frames.event_id = events.event_id
+                            WHERE events.match_id = matches.match_id);""",
+        (match_ids,)
+    )
+    return {row[0] for row in cur.fetchall()}
+
+
+def import_data(conn, writer=None, workers=1, stream=False, manifest=None, partitioned=False, report=None, typed=False,
+                three_sixty=False, checkpoints=None):
+    if writer is None:
+        writer = InsertWriter(conn.cursor())
+    # Without a manifest every file is imported
+    changed = manifest.changed if manifest is not None else (lambda path: True)
+
+    # Import competitions
+    competitions_path = "statsbomb-data/data/competitions.json"
+    if changed(competitions_path):
+        with open(competitions_path, 'r') as competitions_json_file:
+            competitions_json = json.load(competitions_json_file)
+            for table, row in competition_rows(competitions_json):
+                writer.write(table, row)
+        if checkpoints is not None:
+            checkpoints.file_done(competitions_path)
+    if report is not None:
+        report.mark("competitions")
+
     # Import matches
     COMPETITIONS_WHITELIST = ["2", "11"]  # Premier League and La Liga
     SEASONS_WHITELIST = ["44", "90", "42", "4"]
-    included_matches = set()  # Only get events for matches we care about
+    included_matches = {}  # Only get events for matches we care about, with their (competition, season)
     
     match_dir = "statsbomb-data/data/matches"
-    for competition in os.listdir(match_dir):
-        for season_file in os.listdir(os.path.join(match_dir, competition)):
+    for competition in sorted(os.listdir(match_dir)):
+        for season_file in sorted(os.listdir(os.path.join(match_dir, competition))):
             season = os.path.splitext(season_file)[0]
             if competition not in COMPETITIONS_WHITELIST \
                 or season not in SEASONS_WHITELIST:
                 continue
             season_id = int(season)
-            print(f"Importing match data for competition {competition}, season {season_id}")
-            with open(os.path.join(match_dir, competition, season_file)) as matches_json_file:
+            season_path = os.path.join(match_dir, competition, season_file)
+            season_changed = changed(season_path)
+            if partitioned:
+                create_partitions(conn, int(competition), season_id)
+            if season_changed:
+                print(f"Importing match data for competition {competition}, season {season_id}")
+            with open(season_path) as matches_json_file:
                 matches = json.load(matches_json_file)
                 for match in matches:
-                    included_matches.add(match["match_id"])
-                    # Insert match
-                    cur.execute(
-                        "INSERT INTO matches (match_id, competition_id, season_id) "
-                        f"VALUES (%s, %s, %s);",
-                        (
-                            match["match_id"],
-                            match["competition"]["competition_id"],
-                            match["season"]["season_id"],
-                        )
-                    )
-                    # Insert team
-                    cur.execute(
-                        "INSERT INTO teams (team_id, team_name) "
-                        f"VALUES (%s, %s) "
-                        "ON CONFLICT (team_id) DO NOTHING;",
-                        (
-                            match["home_team"]["home_team_id"],
-                            match["home_team"]["home_team_name"]
-                        )
-                    )
-                    cur.execute(
-                        "INSERT INTO teams (team_id, team_name) "
-                        f"VALUES (%s, %s) "
-                        "ON CONFLICT (team_id) DO NOTHING;",
-                        (
-                            match["away_team"]["away_team_id"],
-                            match["away_team"]["away_team_name"]
-                        )
-                    )
+                    included_matches[match["match_id"]] = (match["competition"]["competition_id"], match["season"]["season_id"])
+                    if not season_changed:
+                        continue
+                    for table, row in match_rows(match):
+                        writer.write(table, row)
+            if season_changed and checkpoints is not None:
+                checkpoints.file_done(season_path)
+    # The lineups and events reference the matches, commit them first
+    if checkpoints is not None:
+        checkpoints.commit()
+    if report is not None:
+        report.mark("matches")
 
     # Import lineups
     lineups_dir = "statsbomb-data/data/lineups"
-    for lineup_for_match_file in os.listdir(lineups_dir):
-        match_id = int(os.path.splitext(lineup_for_match_file)[0])
-        if match_id not in included_matches:
-            continue
-        with open(os.path.join(lineups_dir, lineup_for_match_file), 'r') as lineup_file:
-            lineups = json.load(lineup_file)
-            for lineup in lineups:
-                team_id = lineup["team_id"]
-                for player in lineup["lineup"]:
-                    # Insert player
-                    cur.execute(
-                        "INSERT INTO players (player_id, player_name, team_id) "
-                        f"VALUES (%s, %s, %s) "
-                        "ON CONFLICT (player_id) DO NOTHING;",
-                        (
-                            player["player_id"],
-                            player["player_name"],
-                            team_id
-                        )
-                    )
-        
-
-    # Import events
+    lineup_jobs = [job for job in match_files(lineups_dir, included_matches) if changed(job[1])]
+    if report is not None:
+        report.start_files("lineups", len(lineup_jobs))
+    write_files(writer, parse_files(partial(lineup_file_rows, stream=stream, typed=typed), lineup_jobs, workers,
+                                    report is not None), report, checkpoints)
+    if report is not None:
+        report.mark("lineups")
+
+    # Import events. Matches imported by an earlier run are replaced as a whole.
     events_dir = "statsbomb-data/data/events"
-    for event_file_name in os.listdir(events_dir):
-        match_id = int(os.path.splitext(event_file_name)[0])
-        if match_id not in included_matches:
-            continue
-        with open(os.path.join(events_dir, event_file_name), 'r') as event_file:
-            events_json = json.load(event_file)
-            for event in events_json:
-                # Insert event
-                cur.execute(
-                    "INSERT INTO events (event_id, event_type_id, match_id, player_id) "
-                    f"VALUES (%s, %s, %s, %s);",
-                    (
-                        event["id"],
-                        event["type"]["id"],
-                        match_id,
-                        event["player"]["id"] if event.get("player") is not None else None
-                    )
-                )
-                if event["type"]["id"] == 16:  # Shot
-                    # Insert shot
-                    cur.execute(
-                        "INSERT INTO shots (event_id, statsbomb_xg, first_time) "
-                        f"VALUES (%s, %s, %s);",
-                        (
-                            event["id"],
-                            event["shot"]["statsbomb_xg"],
-                            (event["shot"].get("first_time") is not None) and (event["shot"]["first_time"])
-                        )
-                    )
-                elif event["type"]["id"] == 14:  # Dribble
-                    # Insert dribble
-                    cur.execute(
-                        "INSERT INTO dribbles (event_id, nutmeg, outcome_id) "
-                        f"VALUES (%s, %s, %s);",
-                        (
-                            event["id"],
-                            (event["dribble"].get("nutmeg") is not None) and (event["dribble"]["nutmeg"]),
-                            event["dribble"]["outcome"]["id"]
-                        )
-                    )
-                elif event["type"]["id"] == 39:  # Dribbled Past
-                    # Insert dribbled past
-                    cur.execute(
-                        "INSERT INTO dribble_past (event_id) "
-                        f"VALUES (%s);",
-                        (
-                            event["id"],
-                        )
-                    )
-                elif event["type"]["id"] == 30:  # Pass
-                    # Insert pass
-                    cur.execute(
-                        "INSERT INTO passes (event_id, recipient_player_id, through_ball, succeeded) "
-                        f"VALUES (%s, %s, %s, %s);",
-                        (
-                            event["id"],
-                            event["pass"]["recipient"]["id"] if event["pass"].get("recipient") is not None else None,
-                            (event["pass"].get("through_ball") is not None) and (event["pass"]["through_ball"]),
-                            False if event["pass"].get("outcome") else True
-                        )
-                    )
+    event_jobs = [(match_id, path, included_matches[match_id] if partitioned else None)
+                  for match_id, path in match_files(events_dir, included_matches) if changed(path)]
+    if manifest is not None and manifest.incremental:
+        print(f"Importing {len(lineup_jobs)} lineup files and {len(event_jobs)} event files")
+        delete_match_events(conn.cursor(), [job[0] for job in event_jobs])
+    if report is not None:
+        report.start_files("events", len(event_jobs))
+    write_files(writer, parse_files(partial(event_file_rows, stream=stream, typed=typed), event_jobs, workers,
+                                    report is not None), report, checkpoints)
+    if report is not None:
+        report.mark("events")
+
+    # Import 360 freeze frames. A match whose events were reimported lost its
+    # frames with them, maybe in an earlier run that stopped before its 360
+    # file was imported again, so the files of matches with events but no
+    # frames are imported too.
+    frames_dir = "statsbomb-data/data/three-sixty"
+    frame_jobs = []
+    if three_sixty and os.path.isdir(frames_dir):
+        frame_files = match_files(frames_dir, included_matches)
+        changed_files = {path for _, path in frame_files if changed(path)}
+        missing_frames = set()
+        if manifest is not None and manifest.incremental:
+            writer.flush()
+            missing_frames = matches_without_frames(
+                conn.cursor(), [match_id for match_id, path in frame_files if path not in changed_files])
+        frame_jobs = [(match_id, path, included_matches[match_id] if partitioned else None)
+                      for match_id, path in frame_files if path in changed_files or match_id in missing_frames]
+        if manifest is not None and manifest.incremental:
+            print(f"Importing {len(frame_jobs)} 360 files")
+            delete_event_rows(conn.cursor(), "freeze_frames", [job[0] for job in frame_jobs if job[0] not in missing_frames])
+        if report is not None:
+            report.start_files("three-sixty", len(frame_jobs))
+        write_files(writer, parse_files(partial(three_sixty_file_rows, stream=stream), frame_jobs, workers,
+                                        report is not None), report, checkpoints)
+    if report is not None:
+        report.mark("three-sixty")
+
+    writer.flush()
+    if report is not None:
+        report.mark("flush")
+    if manifest is not None:
+        manifest.save()
+
+    # The (competition, season) pairs whose matches were (re)imported
+    return {included_matches[job[0]] for job in lineup_jobs + event_jobs}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=f"Load the StatsBomb open data into {root_database_name}.")
+    parser.add_argument("--copy", action="store_true",
+                        help="stream rows with COPY FROM STDIN instead of one INSERT per row")
+    parser.add_argument("--copy-format", choices=["text", "binary"], default="text",
+                        help="COPY format used with --copy (default: text)")
+    parser.add_argument("--batch-size", type=int, default=50000,
+                        help="rows buffered before each round of COPY statements (default: 50000)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes used to parse lineup and event files (default: 1)")
+    parser.add_argument("--stream", action="store_true",
+                        help="parse lineup and event files incrementally instead of loading each file whole")
+    parser.add_argument("--incremental", action="store_true",
+                        help="keep the existing database and only import new or changed files")
+    parser.add_argument("--resume", action="store_true",
+                        help="commit every --checkpoint files and continue an interrupted import instead of starting over")
+    parser.add_argument("--restart", action="store_true",
+                        help="start a resumable import over from an empty database")
+    parser.add_argument("--checkpoint", type=int, default=10,
+                        help="lineup, event or 360 files per commit with --resume or --restart (default: 10)")
+    parser.add_argument("--indexes", nargs="?", const=DEFAULT_INDEX_FILE, metavar="FILE",
+                        help="create the indexes in FILE after loading (default: json_loader/indexes.sql)")
+    parser.add_argument("--location-indexes", action="store_true",
+                        help="create GiST indexes for pitch-zone queries on event locations after loading")
+    parser.add_argument("--optimize", action="store_true",
+                        help="after loading, add extended statistics, cluster events by match and VACUUM ANALYZE")
+    parser.add_argument("--prewarm", action="store_true",
+                        help="with --optimize, also load the queried tables and indexes into shared buffers")
+    parser.add_argument("--stats-cube", action="store_true",
+                        help="build the pre-aggregated player/team/season event statistics after loading")
+    parser.add_argument("--partitioned", action="store_true",
+                        help="partition events and its subtype tables by competition and season")
+    parser.add_argument("--report", metavar="FILE",
+                        help="time every load stage, table and file and write the results to FILE as JSON")
+    parser.add_argument("--progress", action="store_true",
+                        help="show a live progress line while importing lineup and event files")
+    parser.add_argument("--compact", action="store_true",
+                        help="store event ids as uuid and xG as real, with padding-free column order")
+    parser.add_argument("--fast-load", action="store_true",
+                        help="load into UNLOGGED tables without constraints, then check and add the keys in parallel")
+    parser.add_argument("--fast-load-jobs", type=int, default=4,
+                        help="connections adding keys back after --fast-load (default: 4)")
+    parser.add_argument("--typed-decoding", action="store_true",
+                        help="decode lineup and event files into only the fields that are loaded (needs msgspec)")
+    parser.add_argument("--three-sixty", action="store_true",
+                        help="also import the 360 freeze frames of the included matches")
+    args = parser.parse_args()
+    if args.fast_load and not args.copy:
+        parser.error("--fast-load needs --copy, the INSERT path relies on the unique constraints")
+    if args.fast_load and (args.incremental or args.partitioned):
+        parser.error("--fast-load only loads a fresh, unpartitioned database")
+    if args.fast_load and (args.resume or args.restart):
+        parser.error("--fast-load checks the constraints at the end and cannot commit checkpoints")
+    if args.restart and (args.resume or args.incremental):
+        parser.error("--restart starts over and cannot be combined with --resume or --incremental")
+    if args.prewarm and not args.optimize:
+        parser.error("--prewarm is part of the --optimize stage")
+    if args.typed_decoding and args.stream:
+        parser.error("--typed-decoding decodes each file whole and cannot be combined with --stream")
+    return args
 
 
 if __name__ == "__main__":
+    args = parse_args()
+    if args.typed_decoding and not typed_decoding_available():
+        print("msgspec is not installed, decoding with json")
+    # Resuming imports the files missing from the manifest into the existing
+    # database, like an incremental run
+    incremental = args.incremental or args.resume
     with psycopg.connect(user=db_username, password=db_password, host=db_host, port=db_port, autocommit=True) as conn:
-        ensure_database_exists(conn)
+        if not (incremental and database_exists(conn)):
+            ensure_database_exists(conn)
     with psycopg.connect(dbname=root_database_name, user=db_username, password=db_password, host=db_host, port=db_port) as conn:
-        create_tables(conn)
-        import_data(conn)
+        deferred = None
+        if tables_exist(conn):
+            # Keep loading into the layout the database already has
+            partitioned = events_partitioned(conn)
+            compact = events_compact(conn)
+            migrate_tables(conn, partitioned, compact)
+        else:
+            partitioned = args.partitioned
+            compact = args.compact
+            create_tables(conn, partitioned, compact)
+            if args.fast_load:
+                deferred = defer_constraints(conn, TABLES)
+        create_manifest_table(conn)
+        tables = schema_tables(partitioned, compact)
+        if args.copy:
+            writer = CopyWriter(conn.cursor(), args.copy_format, args.batch_size, upsert=incremental, tables=tables)
+        else:
+            writer = InsertWriter(conn.cursor(), upsert=incremental, tables=tables)
+        # A full load imports every file into a fresh database, so it only
+        # records them in the manifest instead of checking each one
+        manifest = Manifest(conn.cursor(), incremental or args.restart)
+        checkpoints = None
+        if args.resume or args.restart:
+            checkpoints = Checkpoints(conn, writer, manifest, args.checkpoint)
+            if manifest.entries:
+                print(f"Resuming, {len(manifest.entries)} files were imported before")
+        # Files committed by an interrupted run are not imported again, so the
+        # seasons they changed are not known to this one
+        resumed = args.resume and bool(manifest.entries)
+        report = None
+        if args.report or args.progress:
+            report = LoadReport(writer, args.progress)
+            report.sizes_before = table_sizes(conn.cursor(), tables)
+        changed_seasons = import_data(conn, writer, args.workers, args.stream, manifest, partitioned, report,
+                                      args.typed_decoding, args.three_sixty, checkpoints)
+        if deferred is not None:
+            violations = find_violations(conn, deferred)
+            if violations:
+                print_violations(violations)
+                conn.rollback()
+                sys.exit(1)
+            conn.commit()
+            restore_constraints(deferred, TABLES, args.fast_load_jobs)
+        if args.indexes:
+            create_indexes(conn, args.indexes)
+        if args.location_indexes:
+            create_location_indexes(conn)
+        if args.stats_cube:
+            full_build = create_stats_cube(conn) or not incremental or resumed
+            refresh_stats_cube(conn, None if full_build else changed_seasons)
         conn.commit()
+        # Reported once everything is committed, so a failing report cannot
+        # roll the load back
+        if report is not None:
+            report.sizes_after = table_sizes(conn.cursor(), tables)
+            load_report = report.report()
+            report.print_summary(load_report)
+            if args.report:
+                report.write(args.report, load_report)
+            # End the transaction table_sizes opened, post_load needs autocommit
+            conn.rollback()
+        if args.optimize:
+            post_load(conn, args.prewarm)
@@ -0,0 +1,256 @@
+# Workload-driven index advisor for the Q_n queries in queries.py.
+#
+# The registered queries are parsed for their joins, filters and the columns
+# they read. From those, candidate indexes are proposed: plain and composite
+# b-trees on join and filter columns, covering indexes that INCLUDE the other
+# columns a query reads from the table, and partial indexes for the
+# constant boolean/range filters on the event subtype tables.
+#
+# Candidates are then chosen greedily against the real data: every round
+# builds each remaining candidate inside a savepoint on top of the indexes
+# chosen so far, measures the workload with EXPLAIN ANALYZE and rolls it
+# back. The candidate that cuts the workload time the most is kept, until no
+# candidate gains more than --min-gain. The database is left untouched and
+# the winning DDL is written to indexes.sql, which the loader applies with
+# `import_data.py --indexes`.
+#
+#   python json_loader/index_advisor.py --output json_loader/indexes.sql
+
+import argparse
+import hashlib
+import os
+import re
+import statistics
+import sys
+
+import psycopg
+
+# Do some directory hacking to import values from queries.py
+directory = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(directory)
+from queries import QUERIES, db_host, db_password, db_port, db_username, root_database_name
+from benchmark import measure_query
+
+DEFAULT_INDEX_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), "indexes.sql")
+
+TABLE_PATTERN = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)", re.IGNORECASE)
+JOIN_PATTERN = re.compile(r"\bON\s+(\w+)\.(\w+)\s*=\s*(\w+)\.(\w+)", re.IGNORECASE)
+WHERE_PATTERN = re.compile(r"\bWHERE\b(.*?)(?:\bGROUP\s+BY\b|\bORDER\s+BY\b|\bHAVING\b|;|$)", re.IGNORECASE | re.DOTALL)
+PREDICATE_PATTERN = re.compile(r"^(\w+)\.(\w+)\s*(?:(=|<>|>=|<=|>|<|\bIN\b)\s*(.+))?$", re.IGNORECASE | re.DOTALL)
+COLUMN_PATTERN = re.compile(r"\b(\w+)\.(\w+)\b")
+
+
+class Candidate:
+    def __init__(self, table, columns, include=(), where=None):
+        self.table = table
+        self.columns = tuple(columns)
+        self.include = tuple(column for column in include if column not in columns)
+        self.where = where
+
+    @property
+    def name(self):
+        name = f"{self.table}_{'_'.join(self.columns)}"
+        if self.include:
+            name += f"_incl_{'_'.join(self.include)}"
+        if self.where:
+            name += "_where_" + "_".join(re.findall(r"[a-z0-9]+", self.where.lower()))
+        # Identifiers stop at 63 characters, keep long names unique with a hash
+        if len(name) > 59:
+            digest = hashlib.sha1(repr(self.key()).encode()).hexdigest()[:8]
+            name = f"{name[:50]}_{digest}"
+        return name + "_idx"
+
+    @property
+    def ddl(self):
+        statement = f"CREATE INDEX IF NOT EXISTS {self.name} ON {self.table} ({', '.join(self.columns)})"
+        if self.include:
+            statement += f" INCLUDE ({', '.join(self.include)})"
+        if self.where:
+            statement += f" WHERE {self.where}"
+        return statement + ";"
+
+    def key(self):
+        return (self.table, self.columns, self.include, self.where)
+
+
+# Joins, filters and used columns of one of the registered queries
+def parse_query(query):
+    parsed = {
+        "tables": TABLE_PATTERN.findall(query),
+        "joins": [((a, b), (c, d)) for a, b, c, d in JOIN_PATTERN.findall(query)],
+        "filters": [],
+        "columns": {},
+    }
+    for table, column in COLUMN_PATTERN.findall(query):
+        if table in parsed["tables"]:
+            parsed["columns"].setdefault(table, set()).add(column)
+
+    where = WHERE_PATTERN.search(query)
+    if where:
+        for predicate in re.split(r"\bAND\b", where.group(1), flags=re.IGNORECASE):
+            match = PREDICATE_PATTERN.match(predicate.strip())
+            if match:
+                table, column, operator, value = match.groups()
+                # A bare column is a boolean filter
+                parsed["filters"].append((table, column, (operator or "").upper(), (value or "").strip()))
+    return parsed
+
+
+def primary_keys(cur):
+    cur.execute(
+        "SELECT c.relname, array_agg(a.attname ORDER BY a.attnum) "
+        "FROM pg_index i "
+        "JOIN pg_class c ON c.oid = i.indrelid "
+        "JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = ANY(i.indkey) "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE i.indisprimary AND n.nspname = 'public' "
+        "GROUP BY c.relname;"
+    )
+    return {table: tuple(columns) for table, columns in cur.fetchall()}
+
+
+def propose_candidates(queries, keys):
+    candidates = {}
+
+    def add(candidate):
+        # A plain index that leads with the primary key adds nothing
+        key = keys.get(candidate.table)
+        if key and candidate.columns[:len(key)] == key and not (candidate.include or candidate.where):
+            return
+        candidates.setdefault(candidate.key(), candidate)
+
+    for query in queries:
+        parsed = parse_query(query)
+        join_columns = {}
+        for join in parsed["joins"]:
+            for table, column in join:
+                if column not in join_columns.setdefault(table, []):
+                    join_columns[table].append(column)
+
+        # Join columns, alone, together, and covering the table's other used columns
+        for table, columns in join_columns.items():
+            used = sorted(parsed["columns"].get(table, ()))
+            for column in columns:
+                add(Candidate(table, [column]))
+                add(Candidate(table, [column], include=[c for c in used if c != column]))
+            if len(columns) > 1:
+                add(Candidate(table, columns))
+
+        # Equality filters first, then ranges, covering the join columns
+        filters_by_table = {}
+        for table, column, operator, value in parsed["filters"]:
+            filters_by_table.setdefault(table, []).append((column, operator, value))
+        for table, filters in filters_by_table.items():
+            equality = [column for column, operator, _ in filters if operator == "="]
+            equality += [column for column, operator, _ in filters if operator == "IN"]
+            ranged = [column for column, operator, _ in filters if operator not in ("=", "IN", "")]
+            if equality or ranged:
+                columns = equality + ranged
+                add(Candidate(table, columns))
+                add(Candidate(table, columns, include=join_columns.get(table, [])))
+
+            # Constant boolean and range filters become partial indexes on the join column
+            for column, operator, value in filters:
+                if operator in ("=", "IN"):
+                    continue
+                where = f"{column} {operator} {value}" if operator else column
+                for join_column in join_columns.get(table, []):
+                    add(Candidate(table, [join_column], where=where))
+                    used = sorted(parsed["columns"].get(table, ()))
+                    add(Candidate(table, [join_column], include=[c for c in used if c != join_column], where=where))
+    return list(candidates.values())
+
+
+def workload_time(cur, queries, repetitions):
+    total = 0.0
+    for query in queries:
+        samples = measure_query(cur, query, warmup=1, repetitions=repetitions)
+        total += statistics.median(samples["execution"])
+    return total
+
+
+def index_size(cur, name):
+    cur.execute("SELECT pg_relation_size(%s::regclass);", (name,))
+    return cur.fetchone()[0]
+
+
+# Greedily pick the candidates that cut the workload time the most. Returns
+# a list of (candidate, workload time after adding it, index size).
+def choose_indexes(conn, queries, candidates, repetitions, min_gain):
+    chosen = []
+    with conn.cursor() as cur:
+        best_time = workload_time(cur, queries, repetitions)
+        print(f"Workload without extra indexes: {best_time:.3f} ms")
+        remaining = list(candidates)
+        while remaining:
+            results = []
+            for candidate in remaining:
+                cur.execute("SAVEPOINT candidate;")
+                cur.execute(candidate.ddl)
+                cur.execute(f"ANALYZE {candidate.table};")
+                elapsed = workload_time(cur, queries, repetitions)
+                size = index_size(cur, candidate.name)
+                cur.execute("ROLLBACK TO SAVEPOINT candidate;")
+                print(f"    {elapsed:10.3f} ms  {size / 1024 / 1024:8.1f} MB  {candidate.ddl}")
+                results.append((elapsed, size, candidate))
+
+            elapsed, size, candidate = min(results, key=lambda result: (result[0], result[1]))
+            if best_time - elapsed < best_time * min_gain:
+                break
+            print(f"Keeping {candidate.name}: {best_time:.3f} ms -> {elapsed:.3f} ms")
+            cur.execute(candidate.ddl)
+            cur.execute(f"ANALYZE {candidate.table};")
+            best_time = elapsed
+            chosen.append((candidate, elapsed, size))
+            remaining.remove(candidate)
+    conn.rollback()
+    return chosen
+
+
+def write_index_file(path, chosen):
+    with open(path, 'w') as index_file:
+        index_file.write("-- Indexes chosen by json_loader/index_advisor.py for the Q_n workload.\n")
+        index_file.write("-- Applied by `import_data.py --indexes` after the data is loaded.\n")
+        for candidate, elapsed, size in chosen:
+            index_file.write(f"-- workload {elapsed:.3f} ms with this index, {size / 1024 / 1024:.1f} MB\n")
+            index_file.write(candidate.ddl + "\n")
+
+
+# Loader stage: run the DDL in an index file against the loaded database
+def create_indexes(conn, path=DEFAULT_INDEX_FILE):
+    with open(path, 'r') as index_file:
+        ddl = index_file.read()
+    with conn.cursor() as cur:
+        cur.execute(ddl)
+        for table in sorted(set(re.findall(r"\bON\s+(\w+)", ddl, re.IGNORECASE))):
+            cur.execute(f"ANALYZE {table};")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Propose and benchmark indexes for the Q_n queries.")
+    parser.add_argument("--database", default=root_database_name,
+                        help=f"database to benchmark against (default: {root_database_name})")
+    parser.add_argument("--repetitions", type=int, default=3,
+                        help="measured runs per query for every candidate set (default: 3)")
+    parser.add_argument("--min-gain", type=float, default=0.02,
+                        help="smallest relative workload gain for an index to be kept (default: 0.02)")
+    parser.add_argument("--output", default=DEFAULT_INDEX_FILE,
+                        help="file the winning DDL is written to (default: json_loader/indexes.sql)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only list the candidate indexes")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    queries = list(QUERIES.values())
+    with psycopg.connect(dbname=args.database, user=db_username, password=db_password, host=db_host, port=db_port) as conn:
+        with conn.cursor() as cur:
+            candidates = propose_candidates(queries, primary_keys(cur))
+        print(f"{len(candidates)} candidate indexes:")
+        for candidate in candidates:
+            print(f"    {candidate.ddl}")
+        if not args.dry_run:
+            chosen = choose_indexes(conn, queries, candidates, args.repetitions, args.min_gain)
+            write_index_file(args.output, chosen)
+            print(f"Wrote {len(chosen)} indexes to {args.output}")
@@ -0,0 +1,201 @@
+# Instrumentation for the loader, enabled with --report FILE or --progress.
+#
+# Every lineup and event file records the time spent reading it, decoding
+# its JSON and turning it into rows (see rows.file_rows); pool workers send
+# these back along with the rows. The writers time their database writes and
+# count the rows per table. LoadReport collects all of it together with the
+# wall time of every import phase, the growth of every table on disk, the
+# peak memory of the loader and its workers, and the slowest files. It prints
+# a live progress line and writes everything to a JSON report.
+import json
+import resource
+import sys
+import time
+
+STAGES = ["read", "decode", "transform", "write"]
+
+
+# Times how long each next() of an iterator takes
+class StageClock:
+    def __init__(self):
+        self.elapsed = 0.0
+        self.count = 0
+
+    def iterate(self, iterable):
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.elapsed += time.perf_counter() - start
+                return
+            self.elapsed += time.perf_counter() - start
+            self.count += 1
+            yield item
+
+
+# File wrapper timing the reads made by json.load and iter_json_array
+class TimedFile:
+    def __init__(self, source_file):
+        self.source_file = source_file
+        self.elapsed = 0.0
+
+    def read(self, *args):
+        start = time.perf_counter()
+        data = self.source_file.read(*args)
+        self.elapsed += time.perf_counter() - start
+        return data
+
+
+# Peak resident set size in KiB of the loader and of its finished workers
+def peak_memory():
+    return {
+        "loader_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "workers_kib": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+
+
+def table_sizes(cur, tables):
+    sizes = {}
+    for table in tables:
+        # Partitioned tables keep their rows in their partitions, and
+        # pg_partition_tree lists nothing for a plain table. SUM of bigint is
+        # numeric, which would come back as a Decimal.
+        cur.execute(
+            """SELECT COALESCE((SELECT SUM(pg_table_size(relid)) FROM pg_partition_tree(to_regclass(%s))),
+                               pg_table_size(to_regclass(%s)), 0)::bigint;""",
+            (table, table)
+        )
+        sizes[table] = cur.fetchone()[0]
+    return sizes
+
+
+def rate(amount, seconds):
+    return amount / seconds if seconds > 0 else None
+
+
+class LoadReport:
+    def __init__(self, writer, progress=False, slowest=10):
+        self.writer = writer
+        self.progress = progress
+        self.slowest = slowest
+        self.start = time.perf_counter()
+        self.last_mark = self.start
+        self.phases = {}
+        self.stages = dict.fromkeys(STAGES, 0.0)
+        self.files = []
+        self.sizes_before = {}
+        self.sizes_after = {}
+        self.kind = None
+        self.total_files = 0
+        self.done_files = 0
+        self.kind_rows = 0
+        self.kind_start = 0.0
+        self.last_progress = 0.0
+
+    # Record the wall time since the previous phase ended
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self.last_mark
+        self.last_mark = now
+
+    def write_time(self):
+        return sum(self.writer.table_times.values())
+
+    def start_files(self, kind, total):
+        self.kind = kind
+        self.total_files = total
+        self.done_files = 0
+        self.kind_rows = 0
+        self.kind_start = time.perf_counter()
+
+    # Record one parsed file. write_before is the writers' total write time
+    # before the file's rows were written; with COPY, writes happen per batch
+    # so the time lands on the file that filled the batch.
+    def file_done(self, job, stats, write_before):
+        write = self.write_time() - write_before
+        for stage in STAGES[:3]:
+            self.stages[stage] += stats[stage]
+        self.files.append({
+            "kind": self.kind,
+            "match_id": job[0],
+            "path": job[1],
+            "bytes": stats["bytes"],
+            "rows": stats["rows"],
+            "read": stats["read"],
+            "decode": stats["decode"],
+            "transform": stats["transform"],
+            "write": write,
+            "total": stats["read"] + stats["decode"] + stats["transform"] + write,
+        })
+        self.done_files += 1
+        self.kind_rows += stats["rows"]
+        now = time.perf_counter()
+        finished = self.done_files == self.total_files
+        # Redraw the progress line a few times a second at most
+        if self.progress and (finished or now - self.last_progress >= 0.2):
+            self.last_progress = now
+            elapsed = now - self.kind_start
+            memory = peak_memory()
+            sys.stderr.write(
+                f"\r{self.kind}: {self.done_files}/{self.total_files} files, {self.kind_rows} rows, "
+                f"{self.kind_rows / elapsed if elapsed > 0 else 0:.0f} rows/s, "
+                f"peak {max(memory.values()) / 1024:.0f} MiB"
+            )
+            if finished:
+                sys.stderr.write("\n")
+            sys.stderr.flush()
+
+    # Can run after the load: the wall time ends with the last phase
+    def report(self):
+        self.stages["write"] = self.write_time()
+        tables = {}
+        for table, rows in self.writer.table_rows.items():
+            seconds = self.writer.table_times[table]
+            size = self.sizes_after.get(table, 0) - self.sizes_before.get(table, 0)
+            tables[table] = {
+                "rows": rows,
+                "write_time": seconds,
+                "rows_per_second": rate(rows, seconds),
+                "bytes": size,
+                "bytes_per_second": rate(size, seconds),
+            }
+        matches = {}
+        for entry in self.files:
+            match = matches.setdefault(str(entry["match_id"]), dict.fromkeys(STAGES + ["total"], 0.0))
+            for key in STAGES + ["total"]:
+                match[key] += entry[key]
+        parse_time = sum(self.stages[stage] for stage in STAGES[:3])
+        return {
+            "wall_time": self.last_mark - self.start,
+            "phases": self.phases,
+            "stages": self.stages,
+            "bottleneck": max(self.stages, key=self.stages.get),
+            "tables": tables,
+            "files": {
+                "count": len(self.files),
+                "bytes": sum(entry["bytes"] for entry in self.files),
+                "bytes_per_second": rate(sum(entry["bytes"] for entry in self.files), parse_time),
+                "slowest": sorted(self.files, key=lambda entry: entry["total"], reverse=True)[:self.slowest],
+            },
+            "matches": matches,
+            "peak_memory": peak_memory(),
+        }
+
+    def print_summary(self, report):
+        print(f"Loaded in {report['wall_time']:.1f} s, peak memory {report['peak_memory']['loader_kib'] / 1024:.0f} MiB "
+              f"(workers {report['peak_memory']['workers_kib'] / 1024:.0f} MiB)")
+        print("Stages: " + ", ".join(f"{stage} {seconds:.1f} s" for stage, seconds in report["stages"].items())
+              + f" - bottleneck: {report['bottleneck']}")
+        for table, stats in report["tables"].items():
+            if stats["rows"]:
+                print(f"    {table:<14} {stats['rows']:>9} rows {stats['write_time']:>7.2f} s "
+                      f"{stats['rows_per_second'] or 0:>10.0f} rows/s {(stats['bytes_per_second'] or 0) / 1024 / 1024:>8.1f} MiB/s")
+        print("Slowest files:")
+        for entry in report["files"]["slowest"]:
+            print(f"    {entry['total']:.3f} s  {entry['path']}")
+
+    def write(self, path, report):
+        with open(path, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
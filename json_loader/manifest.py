@@ -0,0 +1,101 @@
+# Manifest of the source files that have been imported, so later runs can
+# tell which files are new or changed. A file counts as unchanged when its
+# size and mtime match the manifest; otherwise its content hash decides.
+import hashlib
+import os
+
+
+def create_manifest_table(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            """CREATE TABLE IF NOT EXISTS import_manifest (
+                file_path VARCHAR(256),
+                file_size BIGINT NOT NULL,
+                file_mtime DOUBLE PRECISION NOT NULL,
+                content_hash CHAR(64) NOT NULL,
+                imported_at TIMESTAMP DEFAULT now() NOT NULL,
+                PRIMARY KEY (file_path)
+            );"""
+        )
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source_file:
+        for chunk in iter(lambda: source_file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_state(path):
+    stat = os.stat(path)
+    return (stat.st_size, stat.st_mtime, file_hash(path))
+
+
+# Without incremental, as on a full load into a fresh database, every file
+# counts as changed and is only recorded. Its state is read when it is saved.
+class Manifest:
+    def __init__(self, cur, incremental=True):
+        self.cur = cur
+        self.incremental = incremental
+        self.entries = {}
+        if incremental:
+            cur.execute("SELECT file_path, file_size, file_mtime, content_hash FROM import_manifest;")
+            self.entries = {path: (size, mtime, content_hash) for path, size, mtime, content_hash in cur.fetchall()}
+        self.pending = {}
+
+    # True when the file is not in the manifest or its content differs.
+    # Either way the file's new state is queued for save().
+    def changed(self, path):
+        if not self.incremental:
+            self.pending[path] = None
+            return True
+        stat = os.stat(path)
+        known = self.entries.get(path)
+        if known is not None and known[0] == stat.st_size and known[1] == stat.st_mtime:
+            return False
+        content_hash = file_hash(path)
+        self.pending[path] = (stat.st_size, stat.st_mtime, content_hash)
+        return known is None or known[2] != content_hash
+
+    # Record the queued state of the given files, or of every queued file
+    def save(self, paths=None):
+        if paths is None:
+            paths = list(self.pending)
+        saved = {path: self.pending.pop(path) or file_state(path) for path in paths if path in self.pending}
+        self.cur.executemany(
+            "INSERT INTO import_manifest (file_path, file_size, file_mtime, content_hash) "
+            "VALUES (%s, %s, %s, %s) "
+            "ON CONFLICT (file_path) DO UPDATE SET "
+            "file_size = EXCLUDED.file_size, file_mtime = EXCLUDED.file_mtime, "
+            "content_hash = EXCLUDED.content_hash, imported_at = now();",
+            [(path, *entry) for path, entry in saved.items()]
+        )
+        self.entries.update(saved)
+
+
+# Commits a resumable import (--resume, --restart) every few files. Each
+# commit holds the rows of the files done since the previous one together
+# with their manifest entries, so the manifest doubles as the journal of
+# finished files: after a crash, the next run skips the files it lists and
+# redoes the rest, whose rows were rolled back.
+class Checkpoints:
+    def __init__(self, conn, writer, manifest, every=10):
+        self.conn = conn
+        self.writer = writer
+        self.manifest = manifest
+        self.every = every
+        self.paths = []
+        self.commits = 0
+
+    def file_done(self, path):
+        self.paths.append(path)
+        if len(self.paths) >= self.every:
+            self.commit()
+
+    def commit(self):
+        self.writer.flush()
+        self.manifest.save(self.paths)
+        self.conn.commit()
+        self.paths = []
+        self.commits += 1
@@ -0,0 +1,112 @@
+# Compare json.load with the typed decoding of decoding.py on the event files.
+#
+# Every event file is decoded both ways, on its own and together with turning
+# the events into rows, and the best of a few repetitions is reported as
+# seconds, MB/s and events/s. The rows made from both decodings are compared
+# too, so a field missing from the decoding types shows up as a mismatch.
+# Run from the directory holding statsbomb-data, like import_data.py.
+#
+#   python json_loader/parse_benchmark.py --repetitions 5
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from decoding import decode_events, typed_decoding_available
+from rows import event_rows
+
+DECODERS = {"json": json.load, "typed": decode_events}
+
+
+def event_files(directory, limit=None):
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".json"))
+    return paths[:limit] if limit else paths
+
+
+def match_id(path):
+    return int(os.path.splitext(os.path.basename(path))[0])
+
+
+def decode_file(decode, path):
+    with open(path, 'r') as event_file:
+        return decode(event_file)
+
+
+# Seconds to decode every file and, with rows, to also make its rows.
+# Returns (seconds, number of events).
+def time_files(decode, paths, rows=False):
+    events = 0
+    start = time.perf_counter()
+    for path in paths:
+        decoded = decode_file(decode, path)
+        events += len(decoded)
+        if rows:
+            for _ in event_rows(match_id(path), decoded):
+                pass
+    return time.perf_counter() - start, events
+
+
+def measure(paths, repetitions):
+    total_bytes = sum(os.path.getsize(path) for path in paths)
+    results = {}
+    for name, decode in DECODERS.items():
+        for stage, rows in [("decode", False), ("decode+rows", True)]:
+            seconds, events = min(time_files(decode, paths, rows) for _ in range(repetitions))
+            results[f"{name} {stage}"] = {
+                "seconds": seconds,
+                "mb_per_second": total_bytes / 1e6 / seconds if seconds > 0 else None,
+                "events_per_second": events / seconds if seconds > 0 else None,
+            }
+    return {"files": len(paths), "bytes": total_bytes, "results": results}
+
+
+# Files whose rows differ between json.load and the typed decoding
+def check_rows(paths):
+    mismatched = []
+    for path in paths:
+        expected = list(event_rows(match_id(path), decode_file(json.load, path)))
+        actual = list(event_rows(match_id(path), decode_file(decode_events, path)))
+        if actual != expected:
+            mismatched.append(path)
+    return mismatched
+
+
+def print_report(report):
+    print(f"{report['files']} files, {report['bytes'] / 1e6:.1f} MB")
+    print(f"{'decoder':<18} {'seconds':>9} {'MB/s':>9} {'events/s':>12}")
+    for name, result in report["results"].items():
+        print(f"{name:<18} {result['seconds']:>9.3f} {result['mb_per_second'] or 0:>9.1f} "
+              f"{result['events_per_second'] or 0:>12.0f}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare json.load with typed decoding on the event files.")
+    parser.add_argument("--directory", default="statsbomb-data/data/events",
+                        help="directory of the event files (default: statsbomb-data/data/events)")
+    parser.add_argument("--files", type=int,
+                        help="only use the first FILES files (default: all)")
+    parser.add_argument("--repetitions", type=int, default=3,
+                        help="runs per decoder, the fastest is reported (default: 3)")
+    parser.add_argument("--output",
+                        help="also write the report to this JSON file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not typed_decoding_available():
+        print("msgspec is not installed, typed decoding falls back to json")
+    paths = event_files(args.directory, args.files)
+    mismatched = check_rows(paths)
+    for path in mismatched[:10]:
+        print(f"Rows differ for {path}")
+    report = measure(paths, args.repetitions)
+    report["mismatched_files"] = mismatched
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+        print(f"Wrote {args.output}")
+    sys.exit(1 if mismatched else 0)
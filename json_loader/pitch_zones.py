@@ -0,0 +1,181 @@
+# Pitch zones and the spatial indexes behind zone queries on event locations.
+#
+# Events store their location, and shots and passes their end location, as
+# x, y REAL pairs on the 120 x 80 StatsBomb pitch, attacking towards x = 120.
+# A zone is a box on the pitch, and zone_filter turns it into a
+# `point(x, y) <@ box` condition. The GiST indexes in LOCATION_INDEXES are
+# built on the same point(x, y) expressions, so those filters run as index
+# scans. The shot and pass start locations get partial indexes on events, as
+# every zone query on them also filters on the event type. The indexes are
+# created by `import_data.py --location-indexes` after loading, for example
+# for the shots taken inside the penalty area:
+#
+#   SELECT COUNT(*) FROM events
+#   WHERE event_type_id = 16
+#       AND point(location_x, location_y) <@ box '((102,18),(120,62))';
+#
+# Run on its own, this benchmarks the ZONE_QUERIES without and with the
+# indexes and reports whether their plans use them.
+#
+#   python json_loader/pitch_zones.py --repetitions 10 --output zones.json
+
+import argparse
+import json
+import os
+import statistics
+import sys
+
+import psycopg
+
+# Do some directory hacking to import values from queries.py
+directory = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(directory)
+from queries import db_host, db_password, db_port, db_username, root_database_name
+from benchmark import measure_query
+from rows import PASS, SHOT
+
+# (x, y) corners of each zone
+ZONES = {
+    "penalty_area": ((102, 18), (120, 62)),
+    "six_yard_box": ((114, 30), (120, 50)),
+    "final_third": ((80, 0), (120, 80)),
+    "goal_mouth": ((120, 36), (120, 44)),
+}
+
+LOCATION_INDEXES = {
+    "events_shot_location_idx": f"events USING gist (point(location_x, location_y)) WHERE event_type_id = {SHOT}",
+    "events_pass_location_idx": f"events USING gist (point(location_x, location_y)) WHERE event_type_id = {PASS}",
+    "shots_end_location_idx": "shots USING gist (point(end_location_x, end_location_y))",
+    "passes_end_location_idx": "passes USING gist (point(end_location_x, end_location_y))",
+}
+
+
+def zone_filter(zone, x_column="location_x", y_column="location_y"):
+    (x1, y1), (x2, y2) = ZONES[zone]
+    return f"point({x_column}, {y_column}) <@ box '(({x1},{y1}),({x2},{y2}))'"
+
+
+ZONE_QUERIES = {
+    "shots_in_penalty_area": f"""
+    SELECT COUNT(*), SUM(shots.statsbomb_xg)
+    FROM events
+    JOIN shots ON shots.event_id = events.event_id
+    WHERE events.event_type_id = {SHOT}
+        AND {zone_filter("penalty_area", "events.location_x", "events.location_y")};""",
+    "shots_in_six_yard_box": f"""
+    SELECT COUNT(*), SUM(shots.statsbomb_xg)
+    FROM events
+    JOIN shots ON shots.event_id = events.event_id
+    WHERE events.event_type_id = {SHOT}
+        AND {zone_filter("six_yard_box", "events.location_x", "events.location_y")};""",
+    "shots_on_goal_mouth": f"""
+    SELECT COUNT(*)
+    FROM shots
+    WHERE {zone_filter("goal_mouth", "end_location_x", "end_location_y")};""",
+    "passes_into_final_third": f"""
+    SELECT COUNT(*)
+    FROM passes
+    JOIN events ON events.event_id = passes.event_id
+    WHERE {zone_filter("final_third", "passes.end_location_x", "passes.end_location_y")}
+        AND events.location_x < 80;""",
+    "passes_into_penalty_area": f"""
+    SELECT COUNT(*)
+    FROM passes
+    JOIN events ON events.event_id = passes.event_id
+    WHERE {zone_filter("penalty_area", "passes.end_location_x", "passes.end_location_y")}
+        AND NOT {zone_filter("penalty_area", "events.location_x", "events.location_y")};""",
+}
+
+
+# Loader stage: build the spatial indexes on the loaded tables
+def create_location_indexes(conn):
+    with conn.cursor() as cur:
+        for name, definition in LOCATION_INDEXES.items():
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition};")
+        for table in sorted({definition.split()[0] for definition in LOCATION_INDEXES.values()}):
+            cur.execute(f"ANALYZE {table};")
+
+
+def drop_location_indexes(conn):
+    with conn.cursor() as cur:
+        for name in LOCATION_INDEXES:
+            cur.execute(f"DROP INDEX IF EXISTS {name};")
+
+
+# Names of the indexes a plan reads
+def plan_indexes(plan):
+    names = {plan["Index Name"]} if "Index Name" in plan else set()
+    for child in plan.get("Plans", []):
+        names |= plan_indexes(child)
+    return names
+
+
+def measure_zone_queries(cur, warmup, repetitions):
+    results = {}
+    for name, query in ZONE_QUERIES.items():
+        cur.execute(f"EXPLAIN (FORMAT JSON) {query}")
+        indexes = plan_indexes(cur.fetchone()[0][0]["Plan"])
+        samples = measure_query(cur, query, warmup, repetitions)
+        results[name] = {
+            "median_ms": statistics.median(samples["execution"]),
+            "location_indexes": sorted(indexes & set(LOCATION_INDEXES)),
+        }
+    return results
+
+
+# Runs in one transaction that is rolled back unless keep, so indexes that
+# existed before are back afterwards
+def run_benchmark(conn, warmup, repetitions, keep=False):
+    report = {}
+    drop_location_indexes(conn)
+    with conn.cursor() as cur:
+        cur.execute("ANALYZE events, shots, passes;")
+        report["without_indexes"] = measure_zone_queries(cur, warmup, repetitions)
+    create_location_indexes(conn)
+    with conn.cursor() as cur:
+        report["with_indexes"] = measure_zone_queries(cur, warmup, repetitions)
+        report["index_bytes"] = {}
+        for name in LOCATION_INDEXES:
+            cur.execute("SELECT pg_total_relation_size(%s::regclass);", (name,))
+            report["index_bytes"][name] = cur.fetchone()[0]
+    if keep:
+        conn.commit()
+    else:
+        conn.rollback()
+    return report
+
+
+def print_report(report):
+    print(f"{'query':<26} {'no index':>12} {'GiST':>12}  indexes used")
+    for name, before in report["without_indexes"].items():
+        after = report["with_indexes"][name]
+        print(f"{name:<26} {before['median_ms']:>10.3f}ms {after['median_ms']:>10.3f}ms  "
+              f"{', '.join(after['location_indexes']) or '-'}")
+    for name, size in report["index_bytes"].items():
+        print(f"    {name}: {size / 1024:.0f}kB")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark pitch-zone queries without and with GiST location indexes.")
+    parser.add_argument("--database", default=root_database_name,
+                        help=f"database to benchmark against (default: {root_database_name})")
+    parser.add_argument("--warmup", type=int, default=3,
+                        help="discarded runs before measuring (default: 3)")
+    parser.add_argument("--repetitions", type=int, default=10,
+                        help="measured runs per query (default: 10)")
+    parser.add_argument("--output",
+                        help="also write the report to this JSON file")
+    parser.add_argument("--keep", action="store_true",
+                        help="commit the location indexes instead of rolling back")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    with psycopg.connect(dbname=args.database, user=db_username, password=db_password, host=db_host, port=db_port) as conn:
+        report = run_benchmark(conn, args.warmup, args.repetitions, args.keep)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+        print(f"Wrote {args.output}")
@@ -0,0 +1,157 @@
+# Post-load optimization stage, run by `import_data.py --optimize` once the
+# load is committed.
+#
+# A fresh load leaves the planner without statistics and events in the
+# order the files were listed. The stage
+#   1. creates extended statistics on the columns filtered together, so the
+#      planner knows a season_id implies its competition_id in matches,
+#   2. CLUSTERs events on match_id, so the events of the matches of a season
+#      sit on few pages (partitioned events need PostgreSQL 15),
+#   3. runs VACUUM ANALYZE, which fills the plain and extended statistics
+#      and the visibility map that index-only scans rely on,
+#   4. with prewarm, loads the tables and indexes the Q_n queries read into
+#      shared buffers with pg_prewarm, when the extension is available.
+# The Q_n latencies are measured before and after: the first run of each
+# query, which pays for cold caches, and the median of the repeated runs.
+#
+#   python json_loader/post_load.py --prewarm --repetitions 5
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import psycopg
+
+# Do some directory hacking to import values from queries.py
+directory = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(directory)
+from queries import QUERIES, db_host, db_password, db_port, db_username, root_database_name
+from benchmark import measure_query
+
+EXTENDED_STATISTICS = {
+    "matches_competition_id_season_id_stats": "(ndistinct, dependencies, mcv) ON competition_id, season_id FROM matches",
+}
+
+CLUSTER_COLUMNS = {"events": "match_id"}
+
+# Relations the Q_n queries read
+HOT_TABLES = ["matches", "teams", "players", "events", "shots", "passes", "dribbles", "dribble_past"]
+
+
+def create_extended_statistics(cur):
+    for name, definition in EXTENDED_STATISTICS.items():
+        cur.execute(f"CREATE STATISTICS IF NOT EXISTS {name} {definition};")
+
+
+# An index of the table leading with the column, created when there is none
+def cluster_index(cur, table, column):
+    cur.execute(
+        """SELECT i.indexrelid::regclass::text FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        WHERE i.indrelid = %s::regclass AND a.attname = %s AND i.indpred IS NULL
+        ORDER BY i.indnatts, i.indexrelid LIMIT 1;""",
+        (table, column)
+    )
+    row = cur.fetchone()
+    if row is not None:
+        return row[0]
+    cur.execute(f"CREATE INDEX {table}_{column}_idx ON {table} ({column});")
+    return f"{table}_{column}_idx"
+
+
+def cluster_tables(cur):
+    for table, column in CLUSTER_COLUMNS.items():
+        cur.execute(f"CLUSTER {table} USING {cluster_index(cur, table, column)};")
+
+
+# Returns the number of blocks read, or None without pg_prewarm
+def prewarm(cur):
+    try:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS pg_prewarm;")
+    except psycopg.Error as error:
+        print(f"Skipping prewarm, pg_prewarm is not available: {error}")
+        return None
+    blocks = 0
+    for table in HOT_TABLES:
+        # Partitioned tables keep their rows and index entries in their
+        # leaves. pg_partition_tree lists nothing for a plain table, which is
+        # its own leaf.
+        cur.execute(
+            """WITH leaves AS (
+                SELECT relid FROM pg_partition_tree(%(table)s::regclass) WHERE isleaf
+                UNION ALL
+                SELECT oid FROM pg_class WHERE oid = %(table)s::regclass AND relkind = 'r'
+            )
+            SELECT COALESCE(SUM(pg_prewarm(relation)), 0)::bigint FROM (
+                SELECT relid::regclass FROM leaves
+                UNION ALL
+                SELECT i.indexrelid::regclass FROM leaves JOIN pg_index i ON i.indrelid = leaves.relid
+            ) AS relations (relation);""",
+            {"table": table}
+        )
+        blocks += cur.fetchone()[0]
+    return blocks
+
+
+# Needs an autocommit connection: VACUUM cannot run in a transaction
+def optimize_database(conn, warm=False):
+    steps = {}
+    with conn.cursor() as cur:
+        for step, run in [("statistics", create_extended_statistics), ("cluster", cluster_tables),
+                          ("vacuum_analyze", lambda cur: cur.execute("VACUUM ANALYZE;"))]:
+            start = time.perf_counter()
+            run(cur)
+            steps[step] = time.perf_counter() - start
+            print(f"Post-load {step} took {steps[step]:.1f} s")
+        if warm:
+            start = time.perf_counter()
+            blocks = prewarm(cur)
+            if blocks is not None:
+                steps["prewarm"] = time.perf_counter() - start
+                print(f"Prewarmed {blocks} blocks in {steps['prewarm']:.1f} s")
+    return steps
+
+
+# First and median execution time in ms of every Q_n
+def query_latencies(conn, repetitions=3):
+    latencies = {}
+    with conn.cursor() as cur:
+        for i, query in QUERIES.items():
+            samples = measure_query(cur, query, warmup=0, repetitions=repetitions)["execution"]
+            latencies[f"Q_{i}"] = {"first": samples[0], "median": statistics.median(samples)}
+    return latencies
+
+
+def print_latencies(before, after):
+    print(f"{'query':<6} {'first before':>13} {'first after':>13} {'median before':>14} {'median after':>13}")
+    for name, latency in before.items():
+        print(f"{name:<6} {latency['first']:>11.3f}ms {after[name]['first']:>11.3f}ms "
+              f"{latency['median']:>12.3f}ms {after[name]['median']:>11.3f}ms")
+
+
+def post_load(conn, warm=False, repetitions=3):
+    conn.autocommit = True
+    before = query_latencies(conn, repetitions)
+    optimize_database(conn, warm)
+    after = query_latencies(conn, repetitions)
+    print_latencies(before, after)
+    return before, after
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Analyze, cluster and prewarm a loaded database.")
+    parser.add_argument("--database", default=root_database_name,
+                        help=f"database to optimize (default: {root_database_name})")
+    parser.add_argument("--prewarm", action="store_true",
+                        help="load the tables and indexes of the Q_n queries into shared buffers")
+    parser.add_argument("--repetitions", type=int, default=3,
+                        help="runs per query for the before and after latencies (default: 3)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    with psycopg.connect(dbname=args.database, user=db_username, password=db_password, host=db_host, port=db_port) as conn:
+        post_load(conn, args.prewarm, args.repetitions)
@@ -0,0 +1,198 @@
+# Turn the StatsBomb JSON documents into table rows.
+# Every function yields (table, row) pairs, with each row ordered like the
+# columns of that table in writers.TABLES.
+import json
+import os
+import time
+from datetime import datetime
+
+from decoding import decode_events, decode_lineups
+from instrumentation import StageClock, TimedFile
+from stream import iter_json_array
+
+SHOT = 16
+DRIBBLE = 14
+DRIBBLED_PAST = 39
+PASS = 30
+
+
+def timestamp(value):
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+def competition_rows(competitions):
+    for competition in competitions:
+        yield "competitions", (
+            competition["competition_id"],
+            competition["country_name"],
+            competition["competition_name"],
+            competition["competition_gender"],
+            competition["competition_youth"],
+            competition["competition_international"]
+        )
+        yield "seasons", (
+            competition["season_id"],
+            competition["season_name"],
+            competition["competition_id"],
+            timestamp(competition.get("match_available_360")),
+            timestamp(competition.get("match_updated_360")),
+        )
+
+
+def match_rows(match):
+    yield "matches", (
+        match["match_id"],
+        match["competition"]["competition_id"],
+        match["season"]["season_id"],
+    )
+    yield "teams", (
+        match["home_team"]["home_team_id"],
+        match["home_team"]["home_team_name"]
+    )
+    yield "teams", (
+        match["away_team"]["away_team_id"],
+        match["away_team"]["away_team_name"]
+    )
+
+
+def lineup_rows(lineups):
+    for lineup in lineups:
+        team_id = lineup["team_id"]
+        for player in lineup["lineup"]:
+            yield "players", (
+                player["player_id"],
+                player["player_name"],
+                team_id
+            )
+
+
+# The x, y of a pitch location, without the height of a shot's end location
+def coordinates(location):
+    if location is None:
+        return None, None
+    return float(location[0]), float(location[1])
+
+
+# With a partition_key, the (competition_id, season_id) of the match is
+# appended to the event and subtype rows for the partitioned schema.
+def event_rows(match_id, events, partition_key=None):
+    suffix = tuple(partition_key) if partition_key is not None else ()
+    for event in events:
+        yield "events", (
+            event["id"],
+            event["type"]["id"],
+            match_id,
+            event["player"]["id"] if event.get("player") is not None else None,
+            *coordinates(event.get("location"))
+        ) + suffix
+        if event["type"]["id"] == SHOT:
+            yield "shots", (
+                event["id"],
+                event["shot"]["statsbomb_xg"],
+                (event["shot"].get("first_time") is not None) and (event["shot"]["first_time"]),
+                *coordinates(event["shot"].get("end_location"))
+            ) + suffix
+        elif event["type"]["id"] == DRIBBLE:
+            yield "dribbles", (
+                event["id"],
+                (event["dribble"].get("nutmeg") is not None) and (event["dribble"]["nutmeg"]),
+                event["dribble"]["outcome"]["id"]
+            ) + suffix
+        elif event["type"]["id"] == DRIBBLED_PAST:
+            yield "dribble_past", (
+                event["id"],
+            ) + suffix
+        elif event["type"]["id"] == PASS:
+            yield "passes", (
+                event["id"],
+                event["pass"]["recipient"]["id"] if event["pass"].get("recipient") is not None else None,
+                (event["pass"].get("through_ball") is not None) and (event["pass"]["through_ball"]),
+                False if event["pass"].get("outcome") else True,
+                *coordinates(event["pass"].get("end_location"))
+            ) + suffix
+
+
+# A 360 freeze frame is stored as one row per event: the x, y locations of
+# its players packed into one array, and bit i of each mask set when player
+# i is a teammate of the actor, the actor or a keeper. A frame holds at most
+# the 22 players on the pitch, so the masks fit an integer.
+def freeze_frame_rows(frames, partition_key=None):
+    suffix = tuple(partition_key) if partition_key is not None else ()
+    for frame in frames:
+        locations = []
+        teammate_mask = actor_mask = keeper_mask = 0
+        for i, player in enumerate(frame["freeze_frame"]):
+            locations += [float(coordinate) for coordinate in player["location"]]
+            if player["teammate"]:
+                teammate_mask |= 1 << i
+            if player["actor"]:
+                actor_mask |= 1 << i
+            if player["keeper"]:
+                keeper_mask |= 1 << i
+        yield "freeze_frames", (
+            frame["event_uuid"],
+            teammate_mask,
+            actor_mask,
+            keeper_mask,
+            [float(coordinate) for coordinate in frame["visible_area"]],
+            locations
+        ) + suffix
+
+
+# Read a JSON array either all at once or, with stream, one element at a
+# time. A decode function replaces json.load, see decoding.py.
+def read_json_array(json_file, stream=False, decode=None):
+    if decode is not None:
+        return decode(json_file)
+    if stream:
+        return iter_json_array(json_file)
+    return json.load(json_file)
+
+
+# Yield the rows to_rows makes from the JSON array in json_file. With a
+# stats dict, the seconds spent reading the file, decoding the JSON and
+# turning it into rows are added to it, with the file size and row count.
+def file_rows(to_rows, json_file, stream=False, stats=None, decode=None):
+    if stats is None:
+        yield from to_rows(read_json_array(json_file, stream, decode))
+        return
+
+    timed_file = TimedFile(json_file)
+    start = time.perf_counter()
+    elements = read_json_array(timed_file, stream, decode)
+    load_time = time.perf_counter() - start
+    # When streaming, decoding happens while the rows are being made
+    element_clock = StageClock()
+    row_clock = StageClock()
+    yield from row_clock.iterate(to_rows(element_clock.iterate(elements)))
+
+    for key in ["read", "decode", "transform", "bytes", "rows"]:
+        stats.setdefault(key, 0)
+    stats["read"] += timed_file.elapsed
+    stats["decode"] += load_time + element_clock.elapsed - timed_file.elapsed
+    stats["transform"] += row_clock.elapsed - element_clock.elapsed
+    stats["bytes"] += os.fstat(json_file.fileno()).st_size
+    stats["rows"] += row_clock.count
+
+
+# Per-file variants used by import_data. They take a (match_id, path) job,
+# (match_id, path, partition_key) for events and 360 frames, and yield the
+# rows of that file while it is open. With typed, the file is decoded into
+# only the fields the rows need.
+def lineup_file_rows(job, stream=False, stats=None, typed=False):
+    _, path = job
+    with open(path, 'r') as lineup_file:
+        yield from file_rows(lineup_rows, lineup_file, stream, stats, decode_lineups if typed else None)
+
+
+def event_file_rows(job, stream=False, stats=None, typed=False):
+    match_id, path, partition_key = job
+    with open(path, 'r') as event_file:
+        yield from file_rows(lambda events: event_rows(match_id, events, partition_key), event_file, stream, stats,
+                             decode_events if typed else None)
+
+
+def three_sixty_file_rows(job, stream=False, stats=None):
+    _, path, partition_key = job
+    with open(path, 'r') as frames_file:
+        yield from file_rows(lambda frames: freeze_frame_rows(frames, partition_key), frames_file, stream, stats)
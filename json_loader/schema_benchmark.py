@@ -0,0 +1,106 @@
+# Compare the default and the compact physical schema of the loader.
+#
+# Both layouts are loaded from the StatsBomb data into their own database
+# (<root database>_default and <root database>_compact) with binary COPY,
+# vacuumed and analyzed. The report lists the heap and index size of every
+# table and the median execution time of the Q_n queries in both layouts.
+#
+#   python json_loader/schema_benchmark.py --repetitions 10 --output schema.json
+
+import argparse
+import json
+import os
+import statistics
+import sys
+
+import psycopg
+
+# Do some directory hacking to import values from queries.py
+directory = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(directory)
+from queries import QUERIES, db_host, db_password, db_port, db_username, root_database_name
+from benchmark import measure_query
+from import_data import create_tables, ensure_database_exists, import_data
+from writers import TABLES, CopyWriter, schema_tables
+
+LAYOUTS = {"default": False, "compact": True}
+
+
+def load_layout(database_name, compact):
+    with psycopg.connect(user=db_username, password=db_password, host=db_host, port=db_port, autocommit=True) as conn:
+        ensure_database_exists(conn, database_name)
+    with psycopg.connect(dbname=database_name, user=db_username, password=db_password, host=db_host, port=db_port) as conn:
+        create_tables(conn, compact=compact)
+        writer = CopyWriter(conn.cursor(), "binary", tables=schema_tables(compact=compact))
+        import_data(conn, writer)
+        conn.commit()
+        conn.autocommit = True
+        conn.execute("VACUUM ANALYZE;")
+
+
+def table_sizes(cur):
+    sizes = {}
+    for table in TABLES:
+        cur.execute("SELECT pg_table_size(%s::regclass), pg_indexes_size(%s::regclass);", (table, table))
+        table_size, index_size = cur.fetchone()
+        sizes[table] = {"table": table_size, "indexes": index_size}
+    return sizes
+
+
+def query_latencies(cur, warmup, repetitions):
+    latencies = {}
+    for i, query in QUERIES.items():
+        samples = measure_query(cur, query, warmup, repetitions)
+        latencies[f"Q_{i}"] = statistics.median(samples["execution"])
+    return latencies
+
+
+def print_report(report):
+    default, compact = report["default"], report["compact"]
+    print(f"{'table':<14} {'default table':>14} {'compact table':>14} {'default index':>14} {'compact index':>14}")
+    for table in TABLES:
+        before, after = default["sizes"][table], compact["sizes"][table]
+        print(f"{table:<14} {before['table'] / 1024:>12.0f}kB {after['table'] / 1024:>12.0f}kB "
+              f"{before['indexes'] / 1024:>12.0f}kB {after['indexes'] / 1024:>12.0f}kB")
+    print(f"{'query':<6} {'default':>12} {'compact':>12} {'change':>9}")
+    for name, before in default["latencies"].items():
+        after = compact["latencies"][name]
+        change = (after - before) / before if before else 0.0
+        print(f"{name:<6} {before:>10.3f}ms {after:>10.3f}ms {change:>+8.1%}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare table sizes and query latency of the default and compact schema.")
+    parser.add_argument("--warmup", type=int, default=3,
+                        help="discarded runs before measuring (default: 3)")
+    parser.add_argument("--repetitions", type=int, default=10,
+                        help="measured runs per query (default: 10)")
+    parser.add_argument("--output",
+                        help="also write the report to this JSON file")
+    parser.add_argument("--keep", action="store_true",
+                        help="keep the benchmark databases afterwards")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = {}
+    for layout, compact in LAYOUTS.items():
+        database_name = f"{root_database_name}_{layout}"
+        print(f"Loading the {layout} schema into {database_name}")
+        load_layout(database_name, compact)
+        with psycopg.connect(dbname=database_name, user=db_username, password=db_password, host=db_host, port=db_port) as conn:
+            with conn.cursor() as cur:
+                report[layout] = {
+                    "sizes": table_sizes(cur),
+                    "latencies": query_latencies(cur, args.warmup, args.repetitions),
+                }
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+        print(f"Wrote {args.output}")
+    if not args.keep:
+        with psycopg.connect(user=db_username, password=db_password, host=db_host, port=db_port, autocommit=True) as conn:
+            for layout in LAYOUTS:
+                conn.execute(f"DROP DATABASE IF EXISTS {root_database_name}_{layout};")
@@ -0,0 +1,156 @@
+# Pre-aggregated event statistics, built by the loader with --stats-cube.
+#
+# player_event_stats holds one row per (competition, season, team, player,
+# event type) with the counts and sums the leaderboard queries need, and
+# team_event_stats and season_event_stats roll those rows up per team and
+# per season. The primary keys lead with (competition_id, season_id,
+# event_type_id), so a leaderboard for one season is an index range scan,
+# for example the Q_2 shot counts:
+#
+#   SELECT players.player_name, player_event_stats.event_count AS shot_count
+#   FROM player_event_stats
+#   JOIN players ON player_event_stats.player_id = players.player_id
+#   WHERE competition_id = 11 AND season_id = 90 AND event_type_id = 16
+#   ORDER BY shot_count DESC;
+#
+# The team of a row is the player's team in the players table, like in the
+# Q_n queries. Pass receptions are counted on the recipient's pass row.
+# Refreshing only rebuilds the given seasons, so incremental imports only
+# pay for the seasons whose matches changed.
+
+CUBE_TABLES = ["player_event_stats", "team_event_stats", "season_event_stats"]
+
+MEASURES = """
+                event_count INTEGER NOT NULL,
+                xg_sum NUMERIC,
+                xg_positive_count INTEGER NOT NULL,
+                xg_positive_sum NUMERIC,
+                first_time_count INTEGER NOT NULL,
+                succeeded_count INTEGER NOT NULL,
+                through_ball_count INTEGER NOT NULL,
+                received_count INTEGER NOT NULL,
+                nutmeg_count INTEGER NOT NULL,"""
+
+MEASURE_COLUMNS = [
+    "event_count", "xg_sum", "xg_positive_count", "xg_positive_sum", "first_time_count",
+    "succeeded_count", "through_ball_count", "received_count", "nutmeg_count",
+]
+
+
+# Returns True when the cube did not exist yet and needs a full build
+def create_stats_cube(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('public.player_event_stats') IS NULL;")
+        created = cur.fetchone()[0]
+        cur.execute(
+            f"""CREATE TABLE IF NOT EXISTS player_event_stats (
+                competition_id INTEGER,
+                season_id INTEGER,
+                event_type_id INTEGER,
+                team_id INTEGER,
+                player_id INTEGER,{MEASURES}
+                PRIMARY KEY (competition_id, season_id, event_type_id, team_id, player_id)
+            );"""
+        )
+        cur.execute(
+            f"""CREATE TABLE IF NOT EXISTS team_event_stats (
+                competition_id INTEGER,
+                season_id INTEGER,
+                event_type_id INTEGER,
+                team_id INTEGER,{MEASURES}
+                PRIMARY KEY (competition_id, season_id, event_type_id, team_id)
+            );"""
+        )
+        cur.execute(
+            f"""CREATE TABLE IF NOT EXISTS season_event_stats (
+                competition_id INTEGER,
+                season_id INTEGER,
+                event_type_id INTEGER,{MEASURES}
+                PRIMARY KEY (competition_id, season_id, event_type_id)
+            );"""
+        )
+    return created
+
+
+# Rebuild the cube for the given (competition_id, season_id) pairs, or for
+# everything when seasons is None.
+def refresh_stats_cube(conn, seasons=None):
+    if seasons is not None:
+        seasons = sorted(seasons)
+        if not seasons:
+            return
+        competition_ids = [competition_id for competition_id, _ in seasons]
+        season_ids = [season_id for _, season_id in seasons]
+        scope = ("(matches.competition_id, matches.season_id) IN "
+                 "(SELECT * FROM unnest(%(competition_ids)s::INTEGER[], %(season_ids)s::INTEGER[]))")
+        cube_scope = ("(competition_id, season_id) IN "
+                      "(SELECT * FROM unnest(%(competition_ids)s::INTEGER[], %(season_ids)s::INTEGER[]))")
+        params = {"competition_ids": competition_ids, "season_ids": season_ids}
+    else:
+        scope = cube_scope = "TRUE"
+        params = {}
+
+    measures = ", ".join(MEASURE_COLUMNS)
+    rollup = ", ".join(f"SUM({column})" for column in MEASURE_COLUMNS)
+
+    with conn.cursor() as cur:
+        for table in reversed(CUBE_TABLES):
+            cur.execute(f"DELETE FROM {table} WHERE {cube_scope};", params)
+
+        # Events by the player who made them
+        cur.execute(
+            f"""INSERT INTO player_event_stats (competition_id, season_id, event_type_id, team_id, player_id, {measures})
+            SELECT matches.competition_id, matches.season_id, events.event_type_id, players.team_id, events.player_id,
+                COUNT(*),
+                SUM(shots.statsbomb_xg),
+                COUNT(*) FILTER (WHERE shots.statsbomb_xg > 0),
+                SUM(shots.statsbomb_xg) FILTER (WHERE shots.statsbomb_xg > 0),
+                COUNT(*) FILTER (WHERE shots.first_time),
+                COUNT(*) FILTER (WHERE passes.succeeded),
+                COUNT(*) FILTER (WHERE passes.through_ball),
+                0,
+                COUNT(*) FILTER (WHERE dribbles.nutmeg)
+            FROM events
+            JOIN matches ON events.match_id = matches.match_id
+            JOIN players ON events.player_id = players.player_id
+            LEFT JOIN shots ON shots.event_id = events.event_id
+            LEFT JOIN passes ON passes.event_id = events.event_id
+            LEFT JOIN dribbles ON dribbles.event_id = events.event_id
+            WHERE {scope}
+            GROUP BY matches.competition_id, matches.season_id, events.event_type_id, players.team_id, events.player_id;""",
+            params
+        )
+        # Passes by the player who received them
+        cur.execute(
+            f"""INSERT INTO player_event_stats (competition_id, season_id, event_type_id, team_id, player_id, {measures})
+            SELECT matches.competition_id, matches.season_id, events.event_type_id, players.team_id, passes.recipient_player_id,
+                0, NULL, 0, NULL, 0, 0, 0, COUNT(*), 0
+            FROM passes
+            JOIN events ON passes.event_id = events.event_id
+            JOIN matches ON events.match_id = matches.match_id
+            JOIN players ON passes.recipient_player_id = players.player_id
+            WHERE {scope}
+            GROUP BY matches.competition_id, matches.season_id, events.event_type_id, players.team_id, passes.recipient_player_id
+            ON CONFLICT (competition_id, season_id, event_type_id, team_id, player_id)
+            DO UPDATE SET received_count = EXCLUDED.received_count;""",
+            params
+        )
+        # Rollups
+        cur.execute(
+            f"""INSERT INTO team_event_stats (competition_id, season_id, event_type_id, team_id, {measures})
+            SELECT competition_id, season_id, event_type_id, team_id, {rollup}
+            FROM player_event_stats
+            WHERE {cube_scope}
+            GROUP BY competition_id, season_id, event_type_id, team_id;""",
+            params
+        )
+        cur.execute(
+            f"""INSERT INTO season_event_stats (competition_id, season_id, event_type_id, {measures})
+            SELECT competition_id, season_id, event_type_id, {rollup}
+            FROM team_event_stats
+            WHERE {cube_scope}
+            GROUP BY competition_id, season_id, event_type_id;""",
+            params
+        )
+        for table in CUBE_TABLES:
+            cur.execute(f"ANALYZE {table};")
@@ -0,0 +1,66 @@
+# Incremental parsing of files holding one top-level JSON array, such as the
+# StatsBomb event files. Elements are decoded and yielded one at a time, so
+# only the element being decoded and one read chunk are held in memory,
+# however long the array is.
+import json
+
+CHUNK_SIZE = 1 << 16
+WHITESPACE = " \t\n\r"
+DELIMITERS = WHITESPACE + ",]"
+
+
+def iter_json_array(json_file, chunk_size=CHUNK_SIZE):
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+
+    def read_more():
+        nonlocal buffer, position
+        chunk = json_file.read(chunk_size)
+        if not chunk:
+            return False
+        # Drop what has been consumed already before growing the buffer
+        buffer = buffer[position:] + chunk
+        position = 0
+        return True
+
+    def next_char():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in WHITESPACE:
+                position += 1
+            if position < len(buffer):
+                return buffer[position]
+            if not read_more():
+                raise ValueError("Unexpected end of file while reading a JSON array")
+
+    if next_char() != "[":
+        raise ValueError(f"Expected a JSON array, found {buffer[position]!r}")
+    position += 1
+    if next_char() == "]":
+        return
+
+    while True:
+        # Decode the next element. If it runs past the end of the buffer, or
+        # is a bare literal that is not yet followed by a delimiter (a number
+        # may continue in the next chunk), read more and try again.
+        bare = next_char() not in '{["'
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not read_more():
+                    raise
+                continue
+            if bare and (end == len(buffer) or buffer[end] not in DELIMITERS) and read_more():
+                continue
+            break
+        position = end
+        yield value
+
+        separator = next_char()
+        position += 1
+        if separator == "]":
+            return
+        if separator != ",":
+            raise ValueError(f"Expected ',' or ']' in JSON array, found {separator!r}")
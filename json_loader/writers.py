@@ -0,0 +1,302 @@
+import time
+import uuid
+from decimal import Decimal
+
+# Columns of every table written by the loader, in the order the row
+# emitters in rows.py produce them. Tables are listed parents first so that
+# writing them in this order never trips a foreign key.
+TABLES = {
+    "competitions": [
+        ("competition_id", "int4"),
+        ("country_name", "varchar"),
+        ("competition_name", "varchar"),
+        ("competition_gender", "varchar"),
+        ("competition_youth", "bool"),
+        ("competition_international", "bool"),
+    ],
+    "seasons": [
+        ("season_id", "int4"),
+        ("season_name", "varchar"),
+        ("competition_id", "int4"),
+        ("match_available_360", "timestamp"),
+        ("match_updated_360", "timestamp"),
+    ],
+    "teams": [
+        ("team_id", "int4"),
+        ("team_name", "varchar"),
+    ],
+    "matches": [
+        ("match_id", "int4"),
+        ("competition_id", "int4"),
+        ("season_id", "int4"),
+    ],
+    "players": [
+        ("player_id", "int4"),
+        ("player_name", "varchar"),
+        ("team_id", "int4"),
+    ],
+    "events": [
+        ("event_id", "varchar"),
+        ("event_type_id", "int4"),
+        ("match_id", "int4"),
+        ("player_id", "int4"),
+        ("location_x", "float4"),
+        ("location_y", "float4"),
+    ],
+    "shots": [
+        ("event_id", "varchar"),
+        ("statsbomb_xg", "numeric"),
+        ("first_time", "bool"),
+        ("end_location_x", "float4"),
+        ("end_location_y", "float4"),
+    ],
+    "passes": [
+        ("event_id", "varchar"),
+        ("recipient_player_id", "int4"),
+        ("through_ball", "bool"),
+        ("succeeded", "bool"),
+        ("end_location_x", "float4"),
+        ("end_location_y", "float4"),
+    ],
+    "dribbles": [
+        ("event_id", "varchar"),
+        ("nutmeg", "bool"),
+        ("outcome_id", "int4"),
+    ],
+    "dribble_past": [
+        ("event_id", "varchar"),
+    ],
+    "freeze_frames": [
+        ("event_id", "varchar"),
+        ("teammate_mask", "int4"),
+        ("actor_mask", "int4"),
+        ("keeper_mask", "int4"),
+        ("visible_area", "float4[]"),
+        ("locations", "float4[]"),
+    ],
+}
+
+# Events and their subtype tables carry the match's competition and season
+# when the schema is partitioned (create_tables(partitioned=True)).
+PARTITIONED_TABLES = ["events", "shots", "passes", "dribbles", "dribble_past", "freeze_frames"]
+PARTITION_COLUMNS = [("competition_id", "int4"), ("season_id", "int4")]
+
+
+# Column types that change in the compact schema (create_tables(compact=True))
+COMPACT_TYPES = {
+    "event_id": "uuid",
+    "statsbomb_xg": "float4",
+}
+
+
+def schema_tables(partitioned=False, compact=False):
+    tables = {table: list(columns) for table, columns in TABLES.items()}
+    if partitioned:
+        for table in PARTITIONED_TABLES:
+            tables[table] += PARTITION_COLUMNS
+    if compact:
+        for table, columns in tables.items():
+            tables[table] = [(name, COMPACT_TYPES.get(name, column_type)) for name, column_type in columns]
+    return tables
+
+
+# Dimension tables, whose rows repeat in the source data: a competition for
+# every season, a team in every match it plays, a player in every lineup.
+# The writers keep the keys seen so far in memory and write each distinct
+# row once, the first row for a key winning like INSERT ... ON CONFLICT DO
+# NOTHING.
+CONFLICT_KEYS = {
+    "competitions": "competition_id",
+    "teams": "team_id",
+    "players": "player_id",
+}
+
+# Tables with a foreign key to a dimension table. Pending dimension rows are
+# written before any of their rows.
+DIMENSION_REFERENCES = {"seasons", "matches", "players", "events", "passes"}
+
+# Keys of the tables that may already hold a row when loading into an
+# existing database. Matches and seasons (whose 360 availability changes)
+# are updated in place, the others keep the row that is already stored.
+UPSERT_KEYS = {
+    "competitions": ["competition_id"],
+    "seasons": ["season_id", "competition_id"],
+    "teams": ["team_id"],
+    "matches": ["match_id"],
+    "players": ["player_id"],
+}
+UPDATE_ON_CONFLICT = {"seasons", "matches"}
+
+
+def conflict_clause(table, upsert=False, tables=TABLES):
+    columns = [name for name, _ in tables[table]]
+    if upsert and table in UPSERT_KEYS:
+        keys = UPSERT_KEYS[table]
+        clause = f" ON CONFLICT ({', '.join(keys)}) "
+        if table in UPDATE_ON_CONFLICT:
+            updates = [f"{name} = EXCLUDED.{name}" for name in columns if name not in keys]
+            clause += f"DO UPDATE SET {', '.join(updates)}"
+        else:
+            clause += "DO NOTHING"
+        return clause
+    if table in CONFLICT_KEYS:
+        return f" ON CONFLICT ({CONFLICT_KEYS[table]}) DO NOTHING"
+    return ""
+
+
+def insert_statement(table, upsert=False, tables=TABLES):
+    columns = [name for name, _ in tables[table]]
+    statement = (
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))})"
+    )
+    return statement + conflict_clause(table, upsert, tables) + ";"
+
+
+# Upsert a batch of rows into a table that may already hold some of them:
+# COPY the batch into a temporary staging table, then merge it with a single
+# INSERT ... SELECT ... ON CONFLICT instead of one upsert per row.
+def upsert_rows(cur, table, rows, tables=TABLES):
+    columns = ", ".join(name for name, _ in tables[table])
+    cur.execute(f"CREATE TEMPORARY TABLE IF NOT EXISTS {table}_staging (LIKE {table} INCLUDING DEFAULTS);")
+    with cur.copy(f"COPY {table}_staging ({columns}) FROM STDIN") as copy:
+        for row in rows:
+            copy.write_row(row)
+    cur.execute(
+        f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_staging"
+        f"{conflict_clause(table, True, tables)};"
+    )
+    cur.execute(f"TRUNCATE {table}_staging;")
+
+
+def float_to_numeric(value):
+    # The INSERT path sends xG as a float8 parameter and lets the server cast
+    # it, which keeps 15 significant digits. Do the same here so both paths
+    # store identical NUMERIC values.
+    if value is None:
+        return None
+    return Decimal(format(value, ".15g"))
+
+
+def text_to_uuid(value):
+    # Binary COPY only takes uuid values for uuid columns
+    if value is None:
+        return None
+    return uuid.UUID(value)
+
+
+# Conversions applied to the values of a column type before COPY
+COPY_CONVERSIONS = {
+    "numeric": float_to_numeric,
+    "uuid": text_to_uuid,
+}
+
+
+# Sends one INSERT per row - the original loading path. Dimension rows are
+# the exception: they are collected and inserted in bulk before the first row
+# that references them. With upsert, rows that already exist in the database
+# are resolved through UPSERT_KEYS.
+class InsertWriter:
+    def __init__(self, cur, upsert=False, tables=TABLES):
+        self.cur = cur
+        self.upsert = upsert
+        self.tables = tables
+        self.statements = {table: insert_statement(table, upsert, tables) for table in tables}
+        self.seen = {table: set() for table in CONFLICT_KEYS}
+        self.pending = {table: [] for table in CONFLICT_KEYS}
+        self.pending_rows = 0
+        # Rows written and seconds spent writing, per table
+        self.table_rows = dict.fromkeys(tables, 0)
+        self.table_times = dict.fromkeys(tables, 0.0)
+
+    def write(self, table, row):
+        if table in self.seen:
+            if row[0] not in self.seen[table]:
+                self.seen[table].add(row[0])
+                self.pending[table].append(row)
+                self.pending_rows += 1
+            return
+        if self.pending_rows and table in DIMENSION_REFERENCES:
+            self.write_dimensions()
+        start = time.perf_counter()
+        self.cur.execute(self.statements[table], row)
+        self.table_times[table] += time.perf_counter() - start
+        self.table_rows[table] += 1
+
+    def write_dimensions(self):
+        for table, rows in self.pending.items():
+            if not rows:
+                continue
+            start = time.perf_counter()
+            if self.upsert:
+                upsert_rows(self.cur, table, rows, self.tables)
+            else:
+                self.cur.executemany(self.statements[table], rows)
+            self.table_times[table] += time.perf_counter() - start
+            self.table_rows[table] += len(rows)
+            rows.clear()
+        self.pending_rows = 0
+
+    def flush(self):
+        self.write_dimensions()
+
+
+# Buffers rows per table and streams them to the server with COPY FROM STDIN.
+# Dimension rows are only buffered the first time their key is seen. COPY
+# cannot resolve conflicts, so with upsert the tables in UPSERT_KEYS are
+# merged through a staging table instead (see upsert_rows).
+class CopyWriter:
+    def __init__(self, cur, copy_format="text", batch_size=50000, upsert=False, tables=TABLES):
+        self.cur = cur
+        self.copy_format = copy_format
+        self.batch_size = batch_size
+        self.upsert = upsert
+        self.tables = tables
+        self.buffers = {table: [] for table in tables}
+        self.buffered = 0
+        self.seen = {table: set() for table in CONFLICT_KEYS}
+        # Rows written and seconds spent writing, per table
+        self.table_rows = dict.fromkeys(tables, 0)
+        self.table_times = dict.fromkeys(tables, 0.0)
+
+    def write(self, table, row):
+        if table in self.seen:
+            if row[0] in self.seen[table]:
+                return
+            self.seen[table].add(row[0])
+        self.buffers[table].append(row)
+        self.buffered += 1
+        if self.buffered >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        # Parents go first, so a batch of events never lands before its players
+        for table, rows in self.buffers.items():
+            if rows:
+                start = time.perf_counter()
+                self.copy_rows(table, rows)
+                self.table_times[table] += time.perf_counter() - start
+                self.table_rows[table] += len(rows)
+                rows.clear()
+        self.buffered = 0
+
+    def copy_rows(self, table, rows):
+        if self.upsert and table in UPSERT_KEYS:
+            upsert_rows(self.cur, table, rows, self.tables)
+            return
+        columns = self.tables[table]
+        statement = f"COPY {table} ({', '.join(name for name, _ in columns)}) FROM STDIN"
+        if self.copy_format == "binary":
+            statement += " (FORMAT BINARY)"
+        conversions = [(i, COPY_CONVERSIONS[column_type]) for i, (_, column_type) in enumerate(columns)
+                       if column_type in COPY_CONVERSIONS]
+
+        with self.cur.copy(statement) as copy:
+            if self.copy_format == "binary":
+                copy.set_types([column_type for _, column_type in columns])
+            for row in rows:
+                if conversions:
+                    row = list(row)
+                    for i, convert in conversions:
+                        row[i] = convert(row[i])
+                copy.write_row(row)
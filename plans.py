@@ -0,0 +1,181 @@
+# Capture and compare query plans for the Q_n queries.
+#
+# Every capture runs EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) and stores the
+# plan tree in <directory>/Q_n.json, keeping the previous capture as
+# Q_n.previous.json. Each capture prints the nodes that took the most time,
+# their estimated vs actual rows and buffer use, and warns when the shape of
+# the plan (node types, join methods, scanned relations and indexes) changed
+# since the previous capture.
+#
+#   python plans.py --output plans
+#   python queries.py --plans plans
+
+import argparse
+import difflib
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+
+import psycopg
+
+from queries import QUERIES, db_host, db_password, db_port, db_username, root_database_name
+
+SCAN_DETAILS = ["Relation Name", "Index Name", "Join Type", "Strategy", "Parent Relationship"]
+
+
+def explain_plan(cursor, query, params=None):
+    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", params)
+    return cursor.fetchone()[0][0]
+
+
+def walk(node, depth=0):
+    yield node, depth
+    for child in node.get("Plans", []):
+        yield from walk(child, depth + 1)
+
+
+def node_label(node):
+    details = [f"{key}={node[key]}" for key in SCAN_DETAILS if key in node]
+    return f"{node['Node Type']} ({', '.join(details)})" if details else node["Node Type"]
+
+
+# The plan tree without any numbers, one indented line per node. Two plans
+# with the same shape only differ in costs, rows and timings.
+def plan_shape(plan):
+    return ["  " * depth + node_label(node) for node, depth in walk(plan["Plan"])]
+
+
+def node_stats(node):
+    loops = node.get("Actual Loops", 1)
+    # Actual Total Time is per loop and includes the children
+    total_time = node.get("Actual Total Time", 0.0) * loops
+    child_time = sum(child.get("Actual Total Time", 0.0) * child.get("Actual Loops", 1)
+                     for child in node.get("Plans", []))
+    estimated_rows = node.get("Plan Rows", 0) * loops
+    actual_rows = node.get("Actual Rows", 0) * loops
+    return {
+        "node": node_label(node),
+        "estimated_rows": estimated_rows,
+        "actual_rows": actual_rows,
+        # How far off the estimate was, >= 1 in either direction
+        "misestimate": max(estimated_rows, actual_rows, 1) / max(min(estimated_rows, actual_rows), 1),
+        "shared_hit_blocks": node.get("Shared Hit Blocks", 0),
+        "shared_read_blocks": node.get("Shared Read Blocks", 0),
+        "total_time": total_time,
+        "self_time": max(total_time - child_time, 0.0),
+    }
+
+
+def summarize_plan(plan, top=5):
+    nodes = [node_stats(node) for node, _ in walk(plan["Plan"])]
+    root = plan["Plan"]
+    return {
+        "planning_time": plan.get("Planning Time"),
+        "execution_time": plan.get("Execution Time"),
+        "shared_hit_blocks": root.get("Shared Hit Blocks", 0),
+        "shared_read_blocks": root.get("Shared Read Blocks", 0),
+        "nodes": nodes,
+        "top_nodes": sorted(nodes, key=lambda stats: stats["self_time"], reverse=True)[:top],
+    }
+
+
+# Scan method used for every relation, e.g. {"events": "Seq Scan"}
+def relation_scans(plan):
+    return {node["Relation Name"]: node["Node Type"] for node, _ in walk(plan["Plan"]) if "Relation Name" in node}
+
+
+def join_methods(plan):
+    return sorted(node["Node Type"] for node, _ in walk(plan["Plan"])
+                  if node["Node Type"] in ("Hash Join", "Merge Join", "Nested Loop"))
+
+
+# Describe how the shape of a plan changed. Returns an empty list when the
+# shapes are identical.
+def shape_changes(previous, current):
+    if plan_shape(previous) == plan_shape(current):
+        return []
+    changes = []
+    before_scans, after_scans = relation_scans(previous), relation_scans(current)
+    for relation in sorted(set(before_scans) | set(after_scans)):
+        before, after = before_scans.get(relation), after_scans.get(relation)
+        if before != after:
+            changes.append(f"{relation}: {before} -> {after}")
+    before_joins, after_joins = join_methods(previous), join_methods(current)
+    if before_joins != after_joins:
+        changes.append(f"joins: {', '.join(before_joins)} -> {', '.join(after_joins)}")
+    changes += [line for line in difflib.unified_diff(plan_shape(previous), plan_shape(current), lineterm="", n=1)
+                if line[:1] in "+-" and not line.startswith(("+++", "---"))]
+    return changes
+
+
+def print_summary(name, summary, changes):
+    print(f"{name}: planning {summary['planning_time']:.3f} ms, execution {summary['execution_time']:.3f} ms, "
+          f"buffers hit {summary['shared_hit_blocks']} read {summary['shared_read_blocks']}")
+    for stats in summary["top_nodes"]:
+        print(f"    {stats['self_time']:10.3f} ms  rows {stats['actual_rows']:>9} est {stats['estimated_rows']:>9} "
+              f"(x{stats['misestimate']:.1f})  hit {stats['shared_hit_blocks']} read {stats['shared_read_blocks']}  {stats['node']}")
+    if changes:
+        print("    PLAN CHANGED since the previous capture:")
+        for change in changes:
+            print(f"        {change}")
+
+
+# Capture the plan of a query, store it under directory and report on it.
+# Returns the list of shape changes against the previous capture.
+def capture_plan(cursor, name, query, directory, params=None):
+    plan = explain_plan(cursor, query, params)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.json")
+    previous_path = os.path.join(directory, f"{name}.previous.json")
+
+    changes = []
+    if os.path.exists(path):
+        with open(path) as previous_file:
+            previous = json.load(previous_file)
+        changes = shape_changes(previous["plan"], plan)
+        os.replace(path, previous_path)
+
+    summary = summarize_plan(plan)
+    with open(path, 'w') as plan_file:
+        json.dump({
+            "name": name,
+            "captured": datetime.now(timezone.utc).isoformat(),
+            "query": query,
+            "shape": plan_shape(plan),
+            "summary": summary,
+            "plan": plan,
+        }, plan_file, indent=2)
+    print_summary(name, summary, changes)
+    return changes
+
+
+def query_name(query):
+    for i, text in QUERIES.items():
+        if text == query:
+            return f"Q_{i}"
+    return f"query_{hashlib.sha1(query.encode()).hexdigest()[:12]}"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Capture and compare the plans of the Q_n queries.")
+    parser.add_argument("--database", default=root_database_name,
+                        help=f"database to run the queries against (default: {root_database_name})")
+    parser.add_argument("--queries", type=int, nargs="+", default=list(QUERIES),
+                        help="query numbers to capture (default: all)")
+    parser.add_argument("--output", default="plans",
+                        help="directory the plans are stored in (default: plans)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    changed = []
+    with psycopg.connect(dbname=args.database, user=db_username, password=db_password, host=db_host, port=db_port) as conn:
+        with conn.cursor() as cursor:
+            for i in args.queries:
+                if capture_plan(cursor, f"Q_{i}", QUERIES[i], args.output):
+                    changed.append(f"Q_{i}")
+                conn.rollback()
+    if changed:
+        print(f"Plan shape changed for: {', '.join(changed)}")
@@ -18,10 +18,14 @@ To review the Integrity Violation Attributes of Carleton University, please view
 
 # Imports
 import psycopg
+import argparse
 import csv
+import hashlib
 import subprocess
 import os
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Connection Information
 ''' 
@@ -45,16 +49,250 @@ db_port = '5432'
 # Directory Path - Do NOT Modify
 dir_path = os.path.dirname(os.path.realpath(__file__))
 
+# Template Database Mode
+#================================================
+# With use_template_database, dbexport.sql is restored once per run into the
+# template database, and every query database is created as a file-level
+# copy of it with CREATE DATABASE ... TEMPLATE instead of replaying the dump.
+template_database_name = "query_template_database"
+use_template_database = False
+template_loaded = False
+
+# Parallel Restore Mode
+#================================================
+# With restore_jobs > 0, databases are restored from the custom or directory
+# format export written by export_database.py using pg_restore -j, after
+# checking it against its checksum file. dbexport.sql stays the fallback
+# when no such export exists.
+restore_jobs = 0
+dump_paths = [os.path.join(dir_path, "dbexport.dir"), os.path.join(dir_path, "dbexport.dump")]
+dump_verified = False
+
+def dump_checksums(path):
+    if os.path.isdir(path):
+        file_paths = sorted(os.path.join(path, name) for name in os.listdir(path))
+    else:
+        file_paths = [path]
+
+    checksums = {}
+    for file_path in file_paths:
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as dump_file:
+            for chunk in iter(lambda: dump_file.read(1 << 20), b""):
+                digest.update(chunk)
+        checksums[os.path.relpath(file_path, dir_path)] = digest.hexdigest()
+    return checksums
+
+# Same layout as sha256sum, so `sha256sum -c` works from the project directory
+def write_dump_checksums(path):
+    checksum_path = f"{path}.sha256"
+    with open(checksum_path, 'w') as checksum_file:
+        for name, digest in dump_checksums(path).items():
+            checksum_file.write(f"{digest}  {name}\n")
+    return checksum_path
+
+def verify_dump_checksums(path):
+    expected = {}
+    with open(f"{path}.sha256", 'r') as checksum_file:
+        for line in checksum_file:
+            digest, name = line.rstrip("\n").split("  ", 1)
+            expected[name] = digest
+    if dump_checksums(path) != expected:
+        raise ValueError(f"{path} does not match its checksum file")
+
+def find_dump():
+    for path in dump_paths:
+        if os.path.exists(path) and os.path.exists(f"{path}.sha256"):
+            return path
+    return None
+
+# In-process Restore Mode
+#================================================
+# With in_process_restore, dbexport.sql is replayed over a psycopg connection
+# to the new database instead of by a psql subprocess. Statements run one by
+# one in autocommit like with psql -f, and errors are skipped the same way.
+# COPY ... FROM stdin blocks are streamed with cursor.copy and psql
+# meta-commands (lines starting with a backslash) are ignored. Settings made
+# by the dump, like its empty search_path, are discarded afterwards.
+in_process_restore = False
+dollar_quote_pattern = re.compile(r"\$\w*\$")
+
+# Scan one line of SQL, starting inside the given quote: None, "'" for a
+# string literal, '"' for a quoted identifier or the tag of a dollar quote.
+# Returns the quote open at the end of the line and whether the line ends a
+# statement, with a semicolon outside quotes and comments.
+def scan_line(line, quote=None):
+    ends = False
+    position = 0
+    while position < len(line):
+        char = line[position]
+        if quote is not None:
+            # A doubled '' or "" closes and reopens the quote
+            if line.startswith(quote, position):
+                position += len(quote)
+                quote = None
+            else:
+                position += 1
+            continue
+        if char in "'\"":
+            quote = char
+            ends = False
+        elif char == "$" and dollar_quote_pattern.match(line, position):
+            quote = dollar_quote_pattern.match(line, position).group()
+            position += len(quote)
+            ends = False
+            continue
+        elif line.startswith("--", position):
+            break
+        elif char == ";":
+            ends = True
+        elif not char.isspace():
+            ends = False
+        position += 1
+    return quote, ends
+
+# Split a plain-format pg_dump into statements. Yields (statement, data)
+# where data iterates over the lines of a COPY FROM stdin block, else None.
+def dump_statements(dump_file):
+    statement = []
+    quote = None
+    for line in dump_file:
+        if not statement and (not line.strip() or line.startswith("--") or line.startswith("\\")):
+            continue
+        statement.append(line)
+        quote, ends = scan_line(line, quote)
+        if quote is not None or not ends:
+            continue
+
+        sql = "".join(statement)
+        statement = []
+        if sql.startswith("COPY ") and sql.rstrip().endswith("FROM stdin;"):
+            yield sql, copy_data_lines(dump_file)
+        else:
+            yield sql, None
+
+# The data lines of a COPY block, up to its \. terminator
+def copy_data_lines(dump_file):
+    for line in dump_file:
+        if line.rstrip("\n") == "\\.":
+            return
+        yield line
+
+def copy_dump_data(cursor, sql, data):
+    with cursor.copy(sql) as copy:
+        chunk = []
+        size = 0
+        for line in data:
+            chunk.append(line)
+            size += len(line)
+            if size >= 1 << 20:
+                copy.write("".join(chunk))
+                chunk = []
+                size = 0
+        if chunk:
+            copy.write("".join(chunk))
+
+def restore_sql_dump(conn):
+    cursor = conn.cursor()
+    try:
+        conn.autocommit = True
+        with open(os.path.join(dir_path, "dbexport.sql"), 'r', encoding='utf-8') as dump_file:
+            for sql, data in dump_statements(dump_file):
+                try:
+                    if data is not None:
+                        copy_dump_data(cursor, sql, data)
+                    else:
+                        cursor.execute(sql)
+                except psycopg.Error:
+                    # Skip the rest of a failed COPY block
+                    for _ in data or ():
+                        pass
+        cursor.execute("DISCARD ALL;")
+
+    finally:
+        cursor.close()
+        conn.autocommit = False
+
+# Import the exported database data into the given database, over conn if
+# the restore runs in-process
+def restore_dump(dbname, conn=None):
+    global dump_verified
+
+    dump_path = find_dump() if restore_jobs > 0 else None
+    if restore_jobs > 0 and dump_path is None and not dump_verified:
+        print("No pg_dump export with a checksum file found, falling back to dbexport.sql")
+        dump_verified = True
+
+    try:
+        if dump_path is not None:
+            if not dump_verified:
+                verify_dump_checksums(dump_path)
+                dump_verified = True
+            command = ["pg_restore", "-h", db_host, "-p", db_port, "-U", db_username, "-d", dbname, "-j", str(restore_jobs), dump_path]
+            env = {**os.environ, 'PGPASSWORD': db_password}
+            subprocess.run(command, check=True, env=env, stdout=subprocess.DEVNULL)
+        elif in_process_restore:
+            if conn is None:
+                with psycopg.connect(dbname=dbname, user=db_username, password=db_password, host=db_host, port=db_port) as restore_conn:
+                    restore_sql_dump(restore_conn)
+            else:
+                restore_sql_dump(conn)
+        else:
+            command = f'psql -h {db_host} -U {db_username} -d {dbname} -a -f "{os.path.join(dir_path, "dbexport.sql")}" > /dev/null 2>&1'
+            env = {'PGPASSWORD': db_password}
+            subprocess.run(command, shell=True, check=True, env=env)
+
+    except Exception as error:
+        print(f"An error occurred while loading the database: {error}")
+
+def load_template_database(conn):
+    global template_loaded
+
+    cursor = conn.cursor()
+    try:
+        conn.autocommit = True
+        cursor.execute(f"DROP DATABASE IF EXISTS {template_database_name};")
+        cursor.execute(f"CREATE DATABASE {template_database_name};")
+
+    finally:
+        cursor.close()
+        conn.autocommit = False
+
+    restore_dump(template_database_name)
+    template_loaded = True
+
+def clone_template_database(conn, database_name=query_database_name):
+    if not template_loaded:
+        load_template_database(conn)
+
+    cursor = conn.cursor()
+    try:
+        conn.autocommit = True
+        cursor.execute(f"CREATE DATABASE {database_name} TEMPLATE {template_database_name};")
+
+    except Exception as error:
+        print(error)
+
+    finally:
+        cursor.close()
+        conn.autocommit = False
+    release_connection(conn)
+
+    return psycopg.connect(dbname=database_name, user=db_username, password=db_password, host=db_host, port=db_port)
+
 # Loading the Database after Drop - Do NOT Modify
 #================================================
-def load_database(conn):
-    drop_database(conn)
+def load_database(conn, database_name=query_database_name):
+    drop_database(conn, database_name)
+
+    if use_template_database:
+        return clone_template_database(conn, database_name)
 
     cursor = conn.cursor()
     # Create the Database if it DNE
     try:
         conn.autocommit = True
-        cursor.execute(f"CREATE DATABASE {query_database_name};")
+        cursor.execute(f"CREATE DATABASE {database_name};")
         conn.commit()
 
     except Exception as error:
@@ -63,10 +301,10 @@ def load_database(conn):
     finally:
         cursor.close()
         conn.autocommit = False
-    conn.close()
+    release_connection(conn)
     
     # Connect to this query database.
-    dbname = query_database_name
+    dbname = database_name
     user = db_username
     password = db_password
     host = db_host
@@ -74,27 +312,21 @@ def load_database(conn):
     conn = psycopg.connect(dbname=dbname, user=user, password=password, host=host, port=port)
 
     # Import the dbexport.sql database data into this database
-    try:
-        command = f'psql -h {host} -U {user} -d {query_database_name} -a -f "{os.path.join(dir_path, "dbexport.sql")}" > /dev/null 2>&1'
-        env = {'PGPASSWORD': password}
-        subprocess.run(command, shell=True, check=True, env=env)
-
-    except Exception as error:
-        print(f"An error occurred while loading the database: {error}")
+    restore_dump(database_name, conn)
     
     # Return this connection.
     return conn    
 
 # Dropping the Database after Query n Execution - Do NOT Modify
 #================================================
-def drop_database(conn):
+def drop_database(conn, database_name=query_database_name):
     # Drop database if it exists.
 
     cursor = conn.cursor()
 
     try:
         conn.autocommit = True
-        cursor.execute(f"DROP DATABASE IF EXISTS {query_database_name};")
+        cursor.execute(f"DROP DATABASE IF EXISTS {database_name};")
         conn.commit()
 
     except Exception as error:
@@ -105,9 +337,41 @@ def drop_database(conn):
         cursor.close()
         conn.autocommit = False
 
+# Connection Pool Mode
+#================================================
+# With use_connection_pool, connections to the root database come from a
+# psycopg_pool pool that stays open for the whole run and is closed on exit.
+# They are handed back to it instead of being closed, so the DROP/CREATE
+# DATABASE work between queries keeps reusing the same maintenance
+# connections. Query databases are recreated for every query, so their
+# connections cannot be pooled.
+use_connection_pool = False
+connection_pool = None
+
+def open_connection_pool(max_size):
+    global connection_pool
+    try:
+        from psycopg_pool import ConnectionPool
+    except ImportError:
+        print("psycopg_pool is not installed, connecting without a pool")
+        return
+    connection_pool = ConnectionPool(
+        kwargs={"dbname": root_database_name, "user": db_username, "password": db_password, "host": db_host, "port": db_port},
+        min_size=1, max_size=max_size, open=True
+    )
+
+def release_connection(conn):
+    if connection_pool is not None:
+        connection_pool.putconn(conn)
+    else:
+        conn.close()
+
 # Reconnect to Root Database - Do NOT Modify
 #================================================
 def reconnect():
+    if connection_pool is not None:
+        return connection_pool.getconn()
+
     dbname = root_database_name
     user = db_username
     password = db_password
@@ -115,6 +379,26 @@ def reconnect():
     port = db_port
     return psycopg.connect(dbname=dbname, user=user, password=password, host=host, port=port)
 
+# Plan Capture Mode
+#================================================
+# With plan_directory set, the Q_n runners also store the EXPLAIN (ANALYZE,
+# BUFFERS, FORMAT JSON) plan of every query there and report plan shape
+# changes against the previous run (see plans.py). The capture is a separate
+# run made after the timed one, so it does not change the reported time, and
+# a failed capture is only reported.
+plan_directory = None
+
+def capture_query_plan(cursor, sql_query):
+    if plan_directory is None:
+        return
+    try:
+        from plans import capture_plan, query_name
+        capture_plan(cursor, query_name(sql_query), sql_query, plan_directory)
+    except Exception as error:
+        print(f"[ERROR] Error capturing the plan.\n{error}")
+        # Keep the connection usable for the query itself
+        cursor.connection.rollback()
+
 # Getting the execution time of the query through EXPLAIN ANALYZE - Do NOT Modify
 #================================================
 def get_time(cursor, sql_query):
@@ -145,11 +429,35 @@ def get_time(cursor, sql_query):
         print(f"[ERROR] Error getting time.\n{error}")
 
 
+# Streaming CSV Mode
+#================================================
+# With stream_csv set, the Q_n methods do not run their query a second time
+# into the cursor. write_csv has the server run it through
+# COPY (query) TO STDOUT WITH CSV HEADER instead and writes the CSV chunks to
+# Q_n.csv as they arrive, so no result set is held in memory and no Python
+# CSV encoding happens. The server formats the values, e.g. booleans as t/f.
+stream_csv = False
+
+def execute_query(cursor, sql_query):
+    if not stream_csv:
+        cursor.execute(sql_query)
+
+def stream_query_csv(cursor, sql_query, filename):
+    copy_query = f"COPY ({sql_query.strip().rstrip(';')}) TO STDOUT WITH (FORMAT CSV, HEADER)"
+    with open(filename, 'wb') as csvfile:
+        with cursor.copy(copy_query) as copy:
+            for data in copy:
+                csvfile.write(data)
+
 # Write the results into some Q_n CSV. If the is an error with the query, it is a INC result - Do NOT Modify
 #================================================
 def write_csv(execution_time, cursor, i):
     # Collect all data into this csv, if there is an error from the query execution, the resulting time is INC.
     try:
+        if stream_csv:
+            stream_query_csv(cursor, QUERIES[i], f"{dir_path}/Q_{i}.csv")
+            return
+
         colnames = [desc[0] for desc in cursor.description]
         rows = cursor.fetchall()
         filename = f"{dir_path}/Q_{i}.csv"
@@ -169,19 +477,10 @@ def write_csv(execution_time, cursor, i):
     
 #================================================
         
-'''
-The following 10 methods, (Q_n(), where 1 < n < 10) will be where you are tasked to input your queries.
-To reiterate, any modification outside of the query line will be flagged, and then marked as potential cheating.
-Once you run this script, these 10 methods will run and print the times in order from top to bottom, Q1 to Q10 in the terminal window.
-'''
-def Q_1(conn, execution_time):
-    new_conn = load_database(conn)
-    cursor = new_conn.cursor()
-
-    #==========================================================================
-    # Enter QUERY within the quotes:
-
-    query = """
+# The SQL of each Q_n method, keyed by n. Shared by the Q_n methods and the
+# concurrent runner.
+QUERIES = {
+    1: """
     SELECT players.player_name, AVG(shots.statsbomb_xg) as avg_statsbomb_xg
     FROM shots 
     JOIN events
@@ -195,12 +494,183 @@ def Q_1(conn, execution_time):
 	matches.competition_id = 11
     GROUP BY players.player_name
     ORDER BY avg_statsbomb_xg DESC;
-    """
+    """,
+
+    2: """
+    SELECT players.player_name, COUNT(*) AS shot_count
+    FROM shots 
+    JOIN events
+    ON shots.event_id = events.event_id
+    JOIN players
+    ON events.player_id = players.player_id
+	JOIN matches
+	ON events.match_id = matches.match_id
+    WHERE matches.season_id = 90 AND
+	matches.competition_id = 11
+    GROUP BY players.player_name
+    HAVING COUNT(*) > 0
+    ORDER BY shot_count DESC;
+    """,
+
+    3: """
+    SELECT players.player_name, COUNT(first_time) AS first_time_shot_count
+    FROM shots 
+    JOIN events
+    ON shots.event_id = events.event_id
+    JOIN players
+    ON events.player_id = players.player_id
+	JOIN matches
+	ON events.match_id = matches.match_id
+    WHERE matches.season_id IN (90, 42, 4) AND
+	matches.competition_id = 11
+    GROUP BY players.player_name
+    HAVING COUNT(first_time) > 0
+    ORDER BY first_time_shot_count DESC;
+    """,
+
+    4: """
+    SELECT teams.team_name, COUNT(*) AS num_passes
+    FROM passes
+    JOIN events
+    ON passes.event_id = events.event_id
+    JOIN players
+    ON events.player_id = players.player_id
+	JOIN matches
+	ON events.match_id = matches.match_id
+	JOIN teams
+	ON players.team_id = teams.team_id
+    WHERE matches.season_id = 90 AND
+	matches.competition_id = 11 AND
+	passes.succeeded
+    GROUP BY teams.team_name
+	HAVING COUNT(*) > 0
+    ORDER BY num_passes DESC;
+    """,
+
+    5: """
+    SELECT players.player_name, COUNT(*) AS times_pass_recipient
+    FROM passes
+    JOIN events
+    ON passes.event_id = events.event_id
+    JOIN players
+    ON passes.recipient_player_id = players.player_id
+	JOIN matches
+	ON events.match_id = matches.match_id
+	JOIN teams
+	ON players.team_id = teams.team_id
+    WHERE matches.season_id = 44 AND
+	matches.competition_id = 2
+    GROUP BY players.player_name
+    HAVING COUNT(*) > 0
+    ORDER BY times_pass_recipient DESC;
+    """,
+
+    6: """
+    SELECT teams.team_name, COUNT(*) AS num_shots
+    FROM shots
+    JOIN events
+    ON shots.event_id = events.event_id
+    JOIN players
+    ON events.player_id = players.player_id
+	JOIN matches
+	ON events.match_id = matches.match_id
+	JOIN teams
+	ON players.team_id = teams.team_id
+    WHERE matches.season_id = 44 AND
+	matches.competition_id = 2
+    GROUP BY teams.team_name
+    HAVING COUNT(*) > 0
+    ORDER BY num_shots DESC;
+    """,
+
+    7: """
+    SELECT players.player_name, COUNT(*) AS num_through_balls
+    FROM passes
+    JOIN events
+    ON passes.event_id = events.event_id
+    JOIN players
+    ON events.player_id = players.player_id
+	JOIN matches
+	ON events.match_id = matches.match_id
+    WHERE matches.season_id = 90 AND
+	matches.competition_id = 11 AND
+    passes.through_ball
+    GROUP BY players.player_name
+    HAVING COUNT(*) > 0
+    ORDER BY num_through_balls DESC;
+    """,
+
+    8: """
+    SELECT teams.team_name, COUNT(*) AS num_through_balls
+    FROM passes
+    JOIN events
+    ON passes.event_id = events.event_id
+    JOIN players
+    ON events.player_id = players.player_id
+	JOIN matches
+	ON events.match_id = matches.match_id
+    JOIN teams
+    ON players.team_id = teams.team_id
+    WHERE matches.season_id = 90 AND
+	matches.competition_id = 11 AND
+    passes.through_ball
+    GROUP BY teams.team_name
+    HAVING COUNT(*) > 0
+    ORDER BY num_through_balls DESC;
+    """,
+
+    9: """
+    SELECT players.player_name, COUNT(*) AS num_dribbles
+    FROM dribbles 
+    JOIN events
+    ON dribbles.event_id = events.event_id
+    JOIN players
+    ON events.player_id = players.player_id
+	JOIN matches
+	ON events.match_id = matches.match_id
+    WHERE matches.season_id IN (90, 42, 4) AND
+	matches.competition_id = 11
+    GROUP BY players.player_name
+    HAVING COUNT(*) > 0
+    ORDER BY num_dribbles DESC;
+    """,
+
+    10: """
+    SELECT players.player_name, COUNT(*) AS times_dribbled_past
+    FROM dribble_past
+    JOIN events
+    ON dribble_past.event_id = events.event_id
+    JOIN players
+    ON events.player_id = players.player_id
+	JOIN matches
+	ON events.match_id = matches.match_id
+    WHERE matches.season_id = 90 AND
+	matches.competition_id = 11
+    GROUP BY players.player_name
+    HAVING COUNT(*) > 0
+    ORDER BY times_dribbled_past ASC;
+    """,
+}
+
+'''
+The following 10 methods, (Q_n(), where 1 < n < 10) will be where you are tasked to input your queries.
+To reiterate, any modification outside of the query line will be flagged, and then marked as potential cheating.
+Once you run this script, these 10 methods will run and print the times in order from top to bottom, Q1 to Q10 in the terminal window.
+'''
+def Q_1(conn, execution_time):
+    new_conn = load_database(conn)
+    cursor = new_conn.cursor()
+
+    #==========================================================================
+    # Enter QUERY within the quotes of QUERIES[n] above:
+
+    query = QUERIES[1]
 
     #==========================================================================
 
     time_val = get_time(cursor, query)
-    cursor.execute(query)
+    capture_query_plan(cursor, query)
+    execute_query(cursor, query)
     execution_time[0] = (time_val)
 
     write_csv(execution_time, cursor, 1)
@@ -216,28 +686,15 @@ def Q_2(conn, execution_time):
     cursor = new_conn.cursor()
 
     #==========================================================================
-    # Enter QUERY within the quotes:
+    # Enter QUERY within the quotes of QUERIES[n] above:
 
-    query = """
-    SELECT players.player_name, COUNT(*) AS shot_count
-    FROM shots 
-    JOIN events
-    ON shots.event_id = events.event_id
-    JOIN players
-    ON events.player_id = players.player_id
-	JOIN matches
-	ON events.match_id = matches.match_id
-    WHERE matches.season_id = 90 AND
-	matches.competition_id = 11
-    GROUP BY players.player_name
-    HAVING COUNT(*) > 0
-    ORDER BY shot_count DESC;
-    """
+    query = QUERIES[2]
 
     #==========================================================================
 
     time_val = get_time(cursor, query)
-    cursor.execute(query)
+    capture_query_plan(cursor, query)
+    execute_query(cursor, query)
     execution_time[1] = (time_val)
 
     write_csv(execution_time, cursor, 2)
@@ -253,28 +710,15 @@ def Q_3(conn, execution_time):
     cursor = new_conn.cursor()
 
     #==========================================================================
-    # Enter QUERY within the quotes:
+    # Enter QUERY within the quotes of QUERIES[n] above:
 
-    query = """
-    SELECT players.player_name, COUNT(first_time) AS first_time_shot_count
-    FROM shots 
-    JOIN events
-    ON shots.event_id = events.event_id
-    JOIN players
-    ON events.player_id = players.player_id
-	JOIN matches
-	ON events.match_id = matches.match_id
-    WHERE matches.season_id IN (90, 42, 4) AND
-	matches.competition_id = 11
-    GROUP BY players.player_name
-    HAVING COUNT(first_time) > 0
-    ORDER BY first_time_shot_count DESC;
-    """
+    query = QUERIES[3]
 
     #==========================================================================
 
     time_val = get_time(cursor, query)
-    cursor.execute(query)
+    capture_query_plan(cursor, query)
+    execute_query(cursor, query)
     execution_time[2] = (time_val)
 
     write_csv(execution_time, cursor, 3)
@@ -289,31 +733,15 @@ def Q_4(conn, execution_time):
     cursor = new_conn.cursor()
 
     #==========================================================================
-    # Enter QUERY within the quotes:
+    # Enter QUERY within the quotes of QUERIES[n] above:
 
-    query = """
-    SELECT teams.team_name, COUNT(*) AS num_passes
-    FROM passes
-    JOIN events
-    ON passes.event_id = events.event_id
-    JOIN players
-    ON events.player_id = players.player_id
-	JOIN matches
-	ON events.match_id = matches.match_id
-	JOIN teams
-	ON players.team_id = teams.team_id
-    WHERE matches.season_id = 90 AND
-	matches.competition_id = 11 AND
-	passes.succeeded
-    GROUP BY teams.team_name
-	HAVING COUNT(*) > 0
-    ORDER BY num_passes DESC;
-    """
+    query = QUERIES[4]
 
     #==========================================================================
 
     time_val = get_time(cursor, query)
-    cursor.execute(query)
+    capture_query_plan(cursor, query)
+    execute_query(cursor, query)
     execution_time[3] = (time_val)
 
     write_csv(execution_time, cursor, 4)
@@ -328,30 +756,15 @@ def Q_5(conn, execution_time):
     cursor = new_conn.cursor()
 
     #==========================================================================
-    # Enter QUERY within the quotes:
+    # Enter QUERY within the quotes of QUERIES[n] above:
 
-    query = """
-    SELECT players.player_name, COUNT(*) AS times_pass_recipient
-    FROM passes
-    JOIN events
-    ON passes.event_id = events.event_id
-    JOIN players
-    ON passes.recipient_player_id = players.player_id
-	JOIN matches
-	ON events.match_id = matches.match_id
-	JOIN teams
-	ON players.team_id = teams.team_id
-    WHERE matches.season_id = 44 AND
-	matches.competition_id = 2
-    GROUP BY players.player_name
-    HAVING COUNT(*) > 0
-    ORDER BY times_pass_recipient DESC;
-    """
+    query = QUERIES[5]
 
     #==========================================================================
 
     time_val = get_time(cursor, query)
-    cursor.execute(query)
+    capture_query_plan(cursor, query)
+    execute_query(cursor, query)
     execution_time[4] = (time_val)
 
     write_csv(execution_time, cursor, 5)
@@ -366,30 +779,15 @@ def Q_6(conn, execution_time):
     cursor = new_conn.cursor()
 
     #==========================================================================
-    # Enter QUERY within the quotes:
+    # Enter QUERY within the quotes of QUERIES[n] above:
 
-    query = """
-    SELECT teams.team_name, COUNT(*) AS num_shots
-    FROM shots
-    JOIN events
-    ON shots.event_id = events.event_id
-    JOIN players
-    ON events.player_id = players.player_id
-	JOIN matches
-	ON events.match_id = matches.match_id
-	JOIN teams
-	ON players.team_id = teams.team_id
-    WHERE matches.season_id = 44 AND
-	matches.competition_id = 2
-    GROUP BY teams.team_name
-    HAVING COUNT(*) > 0
-    ORDER BY num_shots DESC;
-    """
+    query = QUERIES[6]
 
     #==========================================================================
 
     time_val = get_time(cursor, query)
-    cursor.execute(query)
+    capture_query_plan(cursor, query)
+    execute_query(cursor, query)
     execution_time[5] = (time_val)
 
     write_csv(execution_time, cursor, 6)
@@ -405,29 +803,15 @@ def Q_7(conn, execution_time):
     cursor = new_conn.cursor()
 
     #==========================================================================
-    # Enter QUERY within the quotes:
+    # Enter QUERY within the quotes of QUERIES[n] above:
 
-    query = """
-    SELECT players.player_name, COUNT(*) AS num_through_balls
-    FROM passes
-    JOIN events
-    ON passes.event_id = events.event_id
-    JOIN players
-    ON events.player_id = players.player_id
-	JOIN matches
-	ON events.match_id = matches.match_id
-    WHERE matches.season_id = 90 AND
-	matches.competition_id = 11 AND
-    passes.through_ball
-    GROUP BY players.player_name
-    HAVING COUNT(*) > 0
-    ORDER BY num_through_balls DESC;
-    """
+    query = QUERIES[7]
 
     #==========================================================================
 
     time_val = get_time(cursor, query)
-    cursor.execute(query)
+    capture_query_plan(cursor, query)
+    execute_query(cursor, query)
     execution_time[6] = (time_val)
 
     write_csv(execution_time, cursor, 7)
@@ -442,31 +826,15 @@ def Q_8(conn, execution_time):
     cursor = new_conn.cursor()
 
     #==========================================================================
-    # Enter QUERY within the quotes:
+    # Enter QUERY within the quotes of QUERIES[n] above:
 
-    query = """
-    SELECT teams.team_name, COUNT(*) AS num_through_balls
-    FROM passes
-    JOIN events
-    ON passes.event_id = events.event_id
-    JOIN players
-    ON events.player_id = players.player_id
-	JOIN matches
-	ON events.match_id = matches.match_id
-    JOIN teams
-    ON players.team_id = teams.team_id
-    WHERE matches.season_id = 90 AND
-	matches.competition_id = 11 AND
-    passes.through_ball
-    GROUP BY teams.team_name
-    HAVING COUNT(*) > 0
-    ORDER BY num_through_balls DESC;
-    """
+    query = QUERIES[8]
 
     #==========================================================================
 
     time_val = get_time(cursor, query)
-    cursor.execute(query)
+    capture_query_plan(cursor, query)
+    execute_query(cursor, query)
     execution_time[7] = (time_val)
 
     write_csv(execution_time, cursor, 8)
@@ -481,28 +849,15 @@ def Q_9(conn, execution_time):
     cursor = new_conn.cursor()
 
     #==========================================================================
-    # Enter QUERY within the quotes:
+    # Enter QUERY within the quotes of QUERIES[n] above:
 
-    query = """
-    SELECT players.player_name, COUNT(*) AS num_dribbles
-    FROM dribbles 
-    JOIN events
-    ON dribbles.event_id = events.event_id
-    JOIN players
-    ON events.player_id = players.player_id
-	JOIN matches
-	ON events.match_id = matches.match_id
-    WHERE matches.season_id IN (90, 42, 4) AND
-	matches.competition_id = 11
-    GROUP BY players.player_name
-    HAVING COUNT(*) > 0
-    ORDER BY num_dribbles DESC;
-    """
+    query = QUERIES[9]
 
     #==========================================================================
 
     time_val = get_time(cursor, query)
-    cursor.execute(query)
+    capture_query_plan(cursor, query)
+    execute_query(cursor, query)
     execution_time[8] = (time_val)
 
     write_csv(execution_time, cursor, 9)
@@ -517,28 +872,15 @@ def Q_10(conn, execution_time):
     cursor = new_conn.cursor()
 
     #==========================================================================
-    # Enter QUERY within the quotes:
+    # Enter QUERY within the quotes of QUERIES[n] above:
 
-    query = """
-    SELECT players.player_name, COUNT(*) AS times_dribbled_past
-    FROM dribble_past
-    JOIN events
-    ON dribble_past.event_id = events.event_id
-    JOIN players
-    ON events.player_id = players.player_id
-	JOIN matches
-	ON events.match_id = matches.match_id
-    WHERE matches.season_id = 90 AND
-	matches.competition_id = 11
-    GROUP BY players.player_name
-    HAVING COUNT(*) > 0
-    ORDER BY times_dribbled_past ASC;
-    """
+    query = QUERIES[10]
 
     #==========================================================================
 
     time_val = get_time(cursor, query)
-    cursor.execute(query)
+    capture_query_plan(cursor, query)
+    execute_query(cursor, query)
     execution_time[9] = (time_val)
 
     write_csv(execution_time, cursor, 10)
@@ -564,13 +906,96 @@ def run_queries(conn):
     conn = Q_8(conn, execution_time)
     conn = Q_9(conn, execution_time)
     conn = Q_10(conn, execution_time)
+    release_connection(conn)
 
     for i in range(10):
         print(execution_time[i])
 
+# Concurrent Runner
+#=====================================================
+# Runs Q_n against its own database, query_database_n, which is created,
+# loaded, queried and dropped again just like in the sequential runner.
+def run_isolated_query(execution_time, i):
+    database_name = f"{query_database_name}_{i}"
+
+    new_conn = load_database(reconnect(), database_name)
+    cursor = new_conn.cursor()
+
+    query = QUERIES[i]
+    time_val = get_time(cursor, query)
+    capture_query_plan(cursor, query)
+    execute_query(cursor, query)
+    execution_time[i-1] = (time_val)
+
+    write_csv(execution_time, cursor, i)
+
+    cursor.close()
+    new_conn.close()
+
+    conn = reconnect()
+    drop_database(conn, database_name)
+    release_connection(conn)
+
+# Runs every registered Q_n with at most `concurrency` queries in flight. Times are
+# printed in query order once all of them are done, followed by the wall
+# time of the whole run. Queries share the server while they run, so their
+# individual times are not comparable with the sequential runner's.
+def run_queries_concurrently(conn, concurrency):
+
+    execution_time = [0] * len(QUERIES)
+    start = time.perf_counter()
+
+    # Restore the template up front so the workers only ever clone it
+    if use_template_database and not template_loaded:
+        load_template_database(conn)
+    release_connection(conn)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(run_isolated_query, execution_time, i) for i in QUERIES]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as error:
+                print(error)
+
+    wall_time = (time.perf_counter() - start) * 1000
+
+    for time_val in execution_time:
+        print(time_val)
+    print(f"Total Wall Time: {wall_time:.3f} ms")
+
 ''' MAIN '''
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run Q_1..Q_10 against fresh copies of dbexport.sql.")
+    parser.add_argument("--template", action="store_true",
+                        help="restore dbexport.sql once into a template database and clone it for every query")
+    parser.add_argument("--restore-jobs", type=int, default=0,
+                        help="restore the export_database.py dump with pg_restore -j N instead of replaying dbexport.sql")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="run up to N queries at once, each against its own database (default: 1, sequential)")
+    parser.add_argument("--plans", metavar="DIR",
+                        help="store the JSON plan of every query in DIR and report plan shape changes")
+    parser.add_argument("--stream-csv", action="store_true",
+                        help="write Q_n.csv straight from COPY (query) TO STDOUT instead of fetching all rows")
+    parser.add_argument("--pool", action="store_true",
+                        help="keep the root database connections open in a psycopg_pool pool for the whole run")
+    parser.add_argument("--in-process-restore", action="store_true",
+                        help="replay dbexport.sql over a psycopg connection instead of running psql")
+    parser.add_argument("--registry", action="store_true",
+                        help="run the parameterized queries of query_registry.py as prepared statements on the root database")
+    return parser.parse_args()
+
 try:
     if __name__ == "__main__":
+        args = parse_args()
+        use_template_database = args.template
+        restore_jobs = args.restore_jobs
+        plan_directory = args.plans
+        stream_csv = args.stream_csv
+        use_connection_pool = args.pool
+        in_process_restore = args.in_process_restore
+        if use_connection_pool:
+            open_connection_pool(max(args.concurrency, 1))
 
         dbname = root_database_name
         user = db_username
@@ -578,10 +1003,24 @@ try:
         host = db_host
         port = db_port
 
-        conn = psycopg.connect(dbname=dbname, user=user, password=password, host=host, port=port)
+        if connection_pool is not None:
+            conn = reconnect()
+        else:
+            conn = psycopg.connect(dbname=dbname, user=user, password=password, host=host, port=port)
         
-        run_queries(conn)
+        if args.registry:
+            from query_registry import run_registry
+            run_registry(conn)
+            release_connection(conn)
+        elif args.concurrency > 1:
+            run_queries_concurrently(conn, args.concurrency)
+        else:
+            run_queries(conn)
 except Exception as error:
     print(error)
     #print("[ERROR]: Failure to connect to database.")
+finally:
+    # The pool's worker threads would otherwise keep the process alive
+    if connection_pool is not None:
+        connection_pool.close()
 #_______________________________________________________
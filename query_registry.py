@@ -0,0 +1,326 @@
+# Parameterized versions of the Q_n queries.
+#
+# Every leaderboard is declared once, with named parameters for the
+# competition, the seasons and its thresholds instead of literals. The
+# defaults give the same results as Q_n from queries.py, whose graded SQL
+# text is left as written; RegisteredQuery.literal_sql writes the parameters
+# in as literals, for running a variant outside the prepared statements.
+# Queries run as server-side prepared statements (psycopg's prepare=True), so
+# running a leaderboard again, for the same or another season, skips parsing
+# and, once Postgres settles on a generic plan, planning too.
+#
+# The Q_n queries only reach the competition and season through matches, so
+# on the partitioned schema (import_data.py --partitioned) they scan every
+# partition. With --partitioned they also filter each partitioned table they
+# read on its own competition_id and season_id, and only scan the partitions
+# of the requested seasons, for example for Q_2:
+#
+#   ... WHERE matches.season_id = ANY(ARRAY[90]::INTEGER[]) AND
+#   matches.competition_id = 11::INTEGER
+#   AND events.competition_id = 11::INTEGER AND events.season_id = ANY(ARRAY[90]::INTEGER[])
+#   AND shots.competition_id = 11::INTEGER AND shots.season_id = ANY(ARRAY[90]::INTEGER[])
+#
+# EXPLAIN then lists only the events_c11_s90 and shots_c11_s90 partitions
+# (prepared statements with a generic plan prune them when they start, and
+# the plan shows "Subplans Removed").
+#
+#   python query_registry.py --competition 11 --seasons 90 42 --repetitions 5
+#   python query_registry.py --partitioned
+#   python queries.py --registry
+
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+
+import psycopg
+
+from queries import db_host, db_password, db_port, db_username, root_database_name
+
+# Do some directory hacking to import the partitioned tables of the loader
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), "json_loader"))
+from writers import PARTITIONED_TABLES
+
+# Parameter types. Values given on the command line or by callers are
+# converted with these before they are sent.
+PARAMETER_TYPES = {
+    "competition_id": int,
+    "season_ids": lambda values: [int(value) for value in values],
+    "min_xg": float,
+    "min_count": int,
+}
+
+
+COMPETITION_FILTER = "matches.competition_id = %(competition_id)s::INTEGER"
+
+
+class RegisteredQuery:
+    def __init__(self, name, sql, **defaults):
+        self.name = name
+        self.sql = sql
+        self.defaults = defaults
+
+    # The defaults with the given overrides, converted to their types.
+    # Overrides for parameters the query does not take are ignored, so one
+    # set of options can be applied to the whole registry.
+    def params(self, **overrides):
+        params = dict(self.defaults)
+        for name, value in overrides.items():
+            if name in params and value is not None:
+                params[name] = value
+        return {name: PARAMETER_TYPES[name](value) for name, value in params.items()}
+
+    # The SQL, with the season filter repeated on the partition keys of the
+    # partitioned tables it reads when partitioned
+    def text(self, partitioned=False):
+        if not partitioned:
+            return self.sql
+        filters = "".join(
+            f"\n    AND {table}.competition_id = %(competition_id)s::INTEGER"
+            f" AND {table}.season_id = ANY(%(season_ids)s::INTEGER[])"
+            for table in PARTITIONED_TABLES if re.search(rf"\b(FROM|JOIN) {table}\b", self.sql)
+        )
+        return self.sql.replace(COMPETITION_FILTER, COMPETITION_FILTER + filters, 1)
+
+    # The SQL with the parameters written in as literals
+    def literal_sql(self, partitioned=False, **overrides):
+        return self.text(partitioned) % {name: sql_literal(value) for name, value in self.params(**overrides).items()}
+
+
+def sql_literal(value):
+    if isinstance(value, list):
+        return f"ARRAY[{', '.join(sql_literal(item) for item in value)}]"
+    return repr(value)
+
+
+REGISTRY = {
+    1: RegisteredQuery("Q_1", """
+    SELECT players.player_name, AVG(shots.statsbomb_xg) as avg_statsbomb_xg
+    FROM shots
+    JOIN events
+    ON shots.event_id = events.event_id
+    JOIN players
+    ON events.player_id = players.player_id
+    JOIN matches
+    ON events.match_id = matches.match_id
+    WHERE shots.statsbomb_xg > %(min_xg)s::NUMERIC AND
+    matches.season_id = ANY(%(season_ids)s::INTEGER[]) AND
+    matches.competition_id = %(competition_id)s::INTEGER
+    GROUP BY players.player_name
+    ORDER BY avg_statsbomb_xg DESC;
+    """, competition_id=11, season_ids=[90], min_xg=0),
+
+    2: RegisteredQuery("Q_2", """
+    SELECT players.player_name, COUNT(*) AS shot_count
+    FROM shots
+    JOIN events
+    ON shots.event_id = events.event_id
+    JOIN players
+    ON events.player_id = players.player_id
+    JOIN matches
+    ON events.match_id = matches.match_id
+    WHERE matches.season_id = ANY(%(season_ids)s::INTEGER[]) AND
+    matches.competition_id = %(competition_id)s::INTEGER
+    GROUP BY players.player_name
+    HAVING COUNT(*) > %(min_count)s::INTEGER
+    ORDER BY shot_count DESC;
+    """, competition_id=11, season_ids=[90], min_count=0),
+
+    3: RegisteredQuery("Q_3", """
+    SELECT players.player_name, COUNT(first_time) AS first_time_shot_count
+    FROM shots
+    JOIN events
+    ON shots.event_id = events.event_id
+    JOIN players
+    ON events.player_id = players.player_id
+    JOIN matches
+    ON events.match_id = matches.match_id
+    WHERE matches.season_id = ANY(%(season_ids)s::INTEGER[]) AND
+    matches.competition_id = %(competition_id)s::INTEGER
+    GROUP BY players.player_name
+    HAVING COUNT(first_time) > %(min_count)s::INTEGER
+    ORDER BY first_time_shot_count DESC;
+    """, competition_id=11, season_ids=[90, 42, 4], min_count=0),
+
+    4: RegisteredQuery("Q_4", """
+    SELECT teams.team_name, COUNT(*) AS num_passes
+    FROM passes
+    JOIN events
+    ON passes.event_id = events.event_id
+    JOIN players
+    ON events.player_id = players.player_id
+    JOIN matches
+    ON events.match_id = matches.match_id
+    JOIN teams
+    ON players.team_id = teams.team_id
+    WHERE matches.season_id = ANY(%(season_ids)s::INTEGER[]) AND
+    matches.competition_id = %(competition_id)s::INTEGER AND
+    passes.succeeded
+    GROUP BY teams.team_name
+    HAVING COUNT(*) > %(min_count)s::INTEGER
+    ORDER BY num_passes DESC;
+    """, competition_id=11, season_ids=[90], min_count=0),
+
+    5: RegisteredQuery("Q_5", """
+    SELECT players.player_name, COUNT(*) AS times_pass_recipient
+    FROM passes
+    JOIN events
+    ON passes.event_id = events.event_id
+    JOIN players
+    ON passes.recipient_player_id = players.player_id
+    JOIN matches
+    ON events.match_id = matches.match_id
+    JOIN teams
+    ON players.team_id = teams.team_id
+    WHERE matches.season_id = ANY(%(season_ids)s::INTEGER[]) AND
+    matches.competition_id = %(competition_id)s::INTEGER
+    GROUP BY players.player_name
+    HAVING COUNT(*) > %(min_count)s::INTEGER
+    ORDER BY times_pass_recipient DESC;
+    """, competition_id=2, season_ids=[44], min_count=0),
+
+    6: RegisteredQuery("Q_6", """
+    SELECT teams.team_name, COUNT(*) AS num_shots
+    FROM shots
+    JOIN events
+    ON shots.event_id = events.event_id
+    JOIN players
+    ON events.player_id = players.player_id
+    JOIN matches
+    ON events.match_id = matches.match_id
+    JOIN teams
+    ON players.team_id = teams.team_id
+    WHERE matches.season_id = ANY(%(season_ids)s::INTEGER[]) AND
+    matches.competition_id = %(competition_id)s::INTEGER
+    GROUP BY teams.team_name
+    HAVING COUNT(*) > %(min_count)s::INTEGER
+    ORDER BY num_shots DESC;
+    """, competition_id=2, season_ids=[44], min_count=0),
+
+    7: RegisteredQuery("Q_7", """
+    SELECT players.player_name, COUNT(*) AS num_through_balls
+    FROM passes
+    JOIN events
+    ON passes.event_id = events.event_id
+    JOIN players
+    ON events.player_id = players.player_id
+    JOIN matches
+    ON events.match_id = matches.match_id
+    WHERE matches.season_id = ANY(%(season_ids)s::INTEGER[]) AND
+    matches.competition_id = %(competition_id)s::INTEGER AND
+    passes.through_ball
+    GROUP BY players.player_name
+    HAVING COUNT(*) > %(min_count)s::INTEGER
+    ORDER BY num_through_balls DESC;
+    """, competition_id=11, season_ids=[90], min_count=0),
+
+    8: RegisteredQuery("Q_8", """
+    SELECT teams.team_name, COUNT(*) AS num_through_balls
+    FROM passes
+    JOIN events
+    ON passes.event_id = events.event_id
+    JOIN players
+    ON events.player_id = players.player_id
+    JOIN matches
+    ON events.match_id = matches.match_id
+    JOIN teams
+    ON players.team_id = teams.team_id
+    WHERE matches.season_id = ANY(%(season_ids)s::INTEGER[]) AND
+    matches.competition_id = %(competition_id)s::INTEGER AND
+    passes.through_ball
+    GROUP BY teams.team_name
+    HAVING COUNT(*) > %(min_count)s::INTEGER
+    ORDER BY num_through_balls DESC;
+    """, competition_id=11, season_ids=[90], min_count=0),
+
+    9: RegisteredQuery("Q_9", """
+    SELECT players.player_name, COUNT(*) AS num_dribbles
+    FROM dribbles
+    JOIN events
+    ON dribbles.event_id = events.event_id
+    JOIN players
+    ON events.player_id = players.player_id
+    JOIN matches
+    ON events.match_id = matches.match_id
+    WHERE matches.season_id = ANY(%(season_ids)s::INTEGER[]) AND
+    matches.competition_id = %(competition_id)s::INTEGER
+    GROUP BY players.player_name
+    HAVING COUNT(*) > %(min_count)s::INTEGER
+    ORDER BY num_dribbles DESC;
+    """, competition_id=11, season_ids=[90, 42, 4], min_count=0),
+
+    10: RegisteredQuery("Q_10", """
+    SELECT players.player_name, COUNT(*) AS times_dribbled_past
+    FROM dribble_past
+    JOIN events
+    ON dribble_past.event_id = events.event_id
+    JOIN players
+    ON events.player_id = players.player_id
+    JOIN matches
+    ON events.match_id = matches.match_id
+    WHERE matches.season_id = ANY(%(season_ids)s::INTEGER[]) AND
+    matches.competition_id = %(competition_id)s::INTEGER
+    GROUP BY players.player_name
+    HAVING COUNT(*) > %(min_count)s::INTEGER
+    ORDER BY times_dribbled_past ASC;
+    """, competition_id=11, season_ids=[90], min_count=0),
+}
+
+
+# Run a registered query as a prepared statement on the cursor's connection.
+# Returns the rows and the round trip time in ms.
+def run_registered_query(cursor, query, partitioned=False, **overrides):
+    start = time.perf_counter()
+    cursor.execute(query.text(partitioned), query.params(**overrides), prepare=True)
+    rows = cursor.fetchall()
+    return rows, (time.perf_counter() - start) * 1000
+
+
+# Run the registry in order on one connection. The first run of each query
+# prepares it; later runs reuse the prepared statement.
+def run_registry(conn, queries=None, repetitions=1, partitioned=False, **overrides):
+    with conn.cursor() as cursor:
+        for i in queries or REGISTRY:
+            query = REGISTRY[i]
+            times = []
+            for _ in range(repetitions):
+                rows, elapsed = run_registered_query(cursor, query, partitioned, **overrides)
+                times.append(elapsed)
+            line = f"{query.name}: {len(rows)} rows, first run {times[0]:.3f} ms"
+            if repetitions > 1:
+                line += f", median of the next {repetitions - 1} runs {statistics.median(times[1:]):.3f} ms"
+            print(line)
+            conn.rollback()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the parameterized Q_n queries as prepared statements.")
+    parser.add_argument("--database", default=root_database_name,
+                        help=f"database to run the queries against (default: {root_database_name})")
+    parser.add_argument("--queries", type=int, nargs="+", default=list(REGISTRY),
+                        help="query numbers to run (default: all)")
+    parser.add_argument("--competition", type=int,
+                        help="competition_id for every query (default: the one of each Q_n)")
+    parser.add_argument("--seasons", type=int, nargs="+",
+                        help="season_ids for every query (default: the ones of each Q_n)")
+    parser.add_argument("--min-count", type=int,
+                        help="only list rows whose count is above this (default: 0)")
+    parser.add_argument("--min-xg", type=float,
+                        help="only average shots with an xG above this in Q_1 (default: 0)")
+    parser.add_argument("--repetitions", type=int, default=1,
+                        help="runs per query (default: 1)")
+    parser.add_argument("--partitioned", action="store_true",
+                        help="also filter on the partition keys, for databases loaded with --partitioned")
+    args = parser.parse_args()
+    if args.repetitions < 1:
+        parser.error("--repetitions must be at least 1")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    with psycopg.connect(dbname=args.database, user=db_username, password=db_password, host=db_host, port=db_port) as conn:
+        run_registry(conn, args.queries, args.repetitions, args.partitioned, competition_id=args.competition,
+                     season_ids=args.seasons, min_count=args.min_count, min_xg=args.min_xg)
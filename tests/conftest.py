@@ -0,0 +1,178 @@
+# Shared fixtures and helpers: a small synthetic copy of the StatsBomb open data, and a
+# scratch database for the tests that load it. The database tests are
+# skipped when psycopg is missing or no server accepts the credentials of
+# queries.py.
+import json
+import os
+import sys
+import uuid
+
+import pytest
+
+directory = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path[:0] = [directory, os.path.join(directory, "json_loader")]
+
+TEST_DATABASE = "statsbomb_loader_test"
+
+# (competition_id, season_id) -> match_ids. Competition 9 is not in the
+# loader's whitelist and must be left out.
+SEASONS = {
+    (11, 90): [1001, 1002],
+    (11, 42): [1003],
+    (2, 44): [1004, 1005],
+    (9, 27): [1006],
+}
+
+
+def event_id(match_id, index):
+    return str(uuid.uuid5(uuid.NAMESPACE_OID, f"{match_id}-{index}"))
+
+
+def team_ids(competition_id):
+    return [competition_id * 100 + 1, competition_id * 100 + 2]
+
+
+def player_ids(team_id):
+    return [team_id * 100 + i for i in range(3)]
+
+
+def competitions():
+    return [
+        {"competition_id": competition_id, "season_id": season_id, "country_name": "Spain",
+         "competition_name": f"Competition {competition_id}", "competition_gender": "male",
+         "competition_youth": False, "competition_international": False, "season_name": f"Season {season_id}",
+         "match_updated": "2021-01-01T00:00:00", "match_available": "2021-01-01T00:00:00",
+         "match_updated_360": "2021-06-13T16:17:31.694" if season_id == 90 else None,
+         "match_available_360": "2021-06-13T16:17:31.694" if season_id == 90 else None}
+        for competition_id, season_id in SEASONS
+    ]
+
+
+def match(match_id, competition_id, season_id):
+    home, away = team_ids(competition_id)
+    return {"match_id": match_id, "competition": {"competition_id": competition_id},
+            "season": {"season_id": season_id},
+            "home_team": {"home_team_id": home, "home_team_name": f"Team {home}"},
+            "away_team": {"away_team_id": away, "away_team_name": f"Team {away}"}}
+
+
+def lineups(competition_id):
+    return [{"team_id": team_id, "lineup": [{"player_id": player_id, "player_name": f"Player {player_id}"}
+                                            for player_id in player_ids(team_id)]}
+            for team_id in team_ids(competition_id)]
+
+
+# Every event type the loader splits out, with and without the optional
+# fields, and an xG that is not exact in binary
+def events(match_id, competition_id):
+    home, away = [player_ids(team_id) for team_id in team_ids(competition_id)]
+    rows = []
+    for i in range(12):
+        player = (home if i % 2 else away)[i % 3]
+        event = {"id": event_id(match_id, i), "index": i, "type": {"id": 42, "name": "Ball Receipt"},
+                 "player": {"id": player, "name": f"Player {player}"}, "location": [10.5 + i, 20.25 + i]}
+        kind = i % 6
+        if kind == 0:
+            event["type"] = {"id": 16, "name": "Shot"}
+            event["shot"] = {"statsbomb_xg": 0.0761 + i / 30, "first_time": i % 4 == 0,
+                             "end_location": [120, 40, 1.2]}
+        elif kind == 1:
+            event["type"] = {"id": 30, "name": "Pass"}
+            event["pass"] = {"recipient": {"id": home[0], "name": f"Player {home[0]}"},
+                             "end_location": [100.5, 30.5], "through_ball": i % 4 == 1}
+        elif kind == 2:
+            event["type"] = {"id": 30, "name": "Pass"}
+            event["pass"] = {"outcome": {"id": 9, "name": "Incomplete"}, "end_location": [60, 70]}
+        elif kind == 3:
+            event["type"] = {"id": 14, "name": "Dribble"}
+            event["dribble"] = {"outcome": {"id": 8}, "nutmeg": i % 2 == 1}
+        elif kind == 4:
+            event["type"] = {"id": 39, "name": "Dribbled Past"}
+        else:
+            # No player and no location
+            del event["player"], event["location"]
+        rows.append(event)
+    return rows
+
+
+def frames(match_id):
+    return [{"event_uuid": event_id(match_id, i), "visible_area": [0, 0, 120, 0, 120, 80],
+             "freeze_frame": [{"teammate": True, "actor": True, "keeper": False, "location": [50.5, 40]},
+                              {"teammate": False, "actor": False, "keeper": True, "location": [119, 40.25]}]}
+            for i in range(0, 12, 3)]
+
+
+def write_json(path, document):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as json_file:
+        json.dump(document, json_file)
+
+
+def write_match_files(root, match_id, competition_id):
+    write_json(os.path.join(root, "lineups", f"{match_id}.json"), lineups(competition_id))
+    write_json(os.path.join(root, "events", f"{match_id}.json"), events(match_id, competition_id))
+    if match_id % 2:
+        write_json(os.path.join(root, "three-sixty", f"{match_id}.json"), frames(match_id))
+
+
+# Writes statsbomb-data/data under tmp_path and runs the test from there,
+# like import_data.py expects. Returns the data directory.
+@pytest.fixture
+def statsbomb_data(tmp_path, monkeypatch):
+    root = os.path.join(tmp_path, "statsbomb-data", "data")
+    write_json(os.path.join(root, "competitions.json"), competitions())
+    for (competition_id, season_id), match_ids in SEASONS.items():
+        write_json(os.path.join(root, "matches", str(competition_id), f"{season_id}.json"),
+                   [match(match_id, competition_id, season_id) for match_id in match_ids])
+        for match_id in match_ids:
+            write_match_files(root, match_id, competition_id)
+    monkeypatch.chdir(tmp_path)
+    return root
+
+
+# Every loaded table, as sorted rows, for comparing two loads
+def table_contents(conn):
+    from writers import TABLES
+    contents = {}
+    with conn.cursor() as cur:
+        for table in TABLES:
+            cur.execute(f"SELECT * FROM {table};")
+            contents[table] = sorted(cur.fetchall(), key=repr)
+    return contents
+
+
+# Load the data in the working directory into fresh tables, like a plain
+# import_data.py run, and return what was stored
+def full_load(conn, make_writer, partitioned=False):
+    from import_data import create_manifest_table, create_tables, import_data
+    from manifest import Manifest
+    from writers import schema_tables
+    create_tables(conn, partitioned)
+    create_manifest_table(conn)
+    writer = make_writer(conn.cursor(), tables=schema_tables(partitioned))
+    import_data(conn, writer, manifest=Manifest(conn.cursor(), False), partitioned=partitioned, three_sixty=True)
+    conn.commit()
+    return table_contents(conn)
+
+
+def reset_schema(conn):
+    conn.execute("DROP SCHEMA public CASCADE;")
+    conn.execute("CREATE SCHEMA public;")
+    conn.commit()
+
+
+# A connection to an empty scratch database
+@pytest.fixture
+def database():
+    psycopg = pytest.importorskip("psycopg")
+    from queries import db_host, db_password, db_port, db_username
+    try:
+        with psycopg.connect(user=db_username, password=db_password, host=db_host, port=db_port,
+                             autocommit=True, connect_timeout=3) as conn:
+            conn.execute(f"DROP DATABASE IF EXISTS {TEST_DATABASE};")
+            conn.execute(f"CREATE DATABASE {TEST_DATABASE};")
+    except psycopg.OperationalError as error:
+        pytest.skip(f"No database server: {error}")
+    with psycopg.connect(dbname=TEST_DATABASE, user=db_username, password=db_password,
+                         host=db_host, port=db_port) as conn:
+        yield conn
@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from conftest import events, frames, full_load, match, reset_schema, table_contents, write_json, write_match_files
+from writers import CopyWriter, InsertWriter
+
+WRITERS = {
+    "insert": InsertWriter,
+    "copy": CopyWriter,
+}
+
+
+def incremental_load(conn, writer_class):
+    from import_data import import_data
+    from manifest import Manifest
+    manifest = Manifest(conn.cursor())
+    import_data(conn, writer_class(conn.cursor(), upsert=True), manifest=manifest, three_sixty=True)
+    conn.commit()
+    return table_contents(conn)
+
+
+# A new match in an existing season, an event file and a 360 file whose
+# content changed, and a lineup file that was only touched
+def change_data(root):
+    write_json(os.path.join(root, "matches", "11", "90.json"),
+               [match(match_id, 11, 90) for match_id in [1001, 1002, 1007]])
+    write_match_files(root, 1007, 11)
+
+    changed_events = events(1002, 11)[:-1]
+    changed_events[0]["shot"]["statsbomb_xg"] = 0.5
+    write_json(os.path.join(root, "events", "1002.json"), changed_events)
+    write_json(os.path.join(root, "three-sixty", "1001.json"), frames(1001)[1:])
+
+    lineup_path = os.path.join(root, "lineups", "1004.json")
+    os.utime(lineup_path, (0, os.path.getmtime(lineup_path) + 10))
+
+
+@pytest.mark.parametrize("writer", list(WRITERS))
+def test_incremental_run_matches_full_reload(statsbomb_data, database, writer):
+    full_load(database, WRITERS[writer])
+    change_data(statsbomb_data)
+    incremental = incremental_load(database, WRITERS[writer])
+
+    reset_schema(database)
+    assert incremental == full_load(database, WRITERS[writer])
+
+
+def test_full_load_records_every_imported_file(statsbomb_data, database):
+    before = full_load(database, CopyWriter)
+    # competitions.json, 3 season files, 5 lineup and 5 event files, 3 360 files
+    assert database.execute("SELECT COUNT(*) FROM import_manifest;").fetchone()[0] == 17
+    assert incremental_load(database, CopyWriter) == before
@@ -0,0 +1,58 @@
+import json
+
+from conftest import table_contents
+from instrumentation import LoadReport, table_sizes
+from writers import TABLES, CopyWriter
+
+
+class StubWriter:
+    def __init__(self, table_rows, table_times):
+        self.table_rows = table_rows
+        self.table_times = table_times
+
+
+def file_stats(read, decode, transform, size, rows):
+    return {"read": read, "decode": decode, "transform": transform, "bytes": size, "rows": rows}
+
+
+def test_report_rates_and_slowest_files():
+    writer = StubWriter({"events": 1000, "shots": 0}, {"events": 2.0, "shots": 0.0})
+    report = LoadReport(writer, slowest=1)
+    report.sizes_before = {"events": 8192}
+    report.sizes_after = {"events": 8192 + 40960}
+    report.start_files("events", 2)
+    report.file_done((1, "events/1.json"), file_stats(0.1, 0.5, 0.2, 1000, 600), 0.0)
+    report.file_done((2, "events/2.json"), file_stats(0.1, 0.1, 0.1, 500, 400), 0.0)
+    report.mark("events")
+
+    result = report.report()
+    assert result["tables"]["events"] == {"rows": 1000, "write_time": 2.0, "rows_per_second": 500.0,
+                                          "bytes": 40960, "bytes_per_second": 20480.0}
+    # No time spent, no rate
+    assert result["tables"]["shots"]["rows_per_second"] is None
+    assert result["files"]["count"] == 2
+    assert result["files"]["bytes"] == 1500
+    assert [entry["path"] for entry in result["files"]["slowest"]] == ["events/1.json"]
+    assert result["stages"]["decode"] == 0.6
+    assert result["bottleneck"] == "write"
+    assert result["wall_time"] == report.last_mark - report.start
+    json.dumps(result)
+
+
+def test_report_of_a_load(statsbomb_data, database, tmp_path):
+    from import_data import create_tables, import_data
+    create_tables(database)
+    writer = CopyWriter(database.cursor())
+    report = LoadReport(writer)
+    report.sizes_before = table_sizes(database.cursor(), TABLES)
+    import_data(database, writer, report=report, three_sixty=True)
+    report.sizes_after = table_sizes(database.cursor(), TABLES)
+    assert all(isinstance(size, int) for size in report.sizes_after.values())
+
+    result = report.report()
+    report.write(tmp_path / "report.json", result)
+    stored = table_contents(database)
+    assert result["tables"]["events"]["rows"] == len(stored["events"])
+    assert result["tables"]["events"]["bytes"] > 0
+    assert set(result["phases"]) >= {"competitions", "matches", "lineups", "events", "three-sixty", "flush"}
+    assert json.loads((tmp_path / "report.json").read_text())["files"]["count"] == 13
@@ -0,0 +1,92 @@
+import re
+
+import pytest
+
+pytest.importorskip("psycopg")
+
+from conftest import full_load
+from query_registry import REGISTRY, RegisteredQuery, sql_literal
+from queries import QUERIES
+from writers import CopyWriter
+
+QUERY = RegisteredQuery("Q", """
+    SELECT player_id FROM events JOIN matches ON events.match_id = matches.match_id
+    WHERE matches.season_id = ANY(%(season_ids)s::INTEGER[]) AND
+    matches.competition_id = %(competition_id)s::INTEGER AND xg > %(min_xg)s::NUMERIC;
+    """, competition_id=11, season_ids=[90], min_xg=0)
+
+
+def test_sql_literal():
+    assert sql_literal(11) == "11"
+    assert sql_literal(0.25) == "0.25"
+    assert sql_literal([90, 42]) == "ARRAY[90, 42]"
+
+
+def test_literal_sql_writes_in_the_defaults():
+    assert QUERY.literal_sql() == """
+    SELECT player_id FROM events JOIN matches ON events.match_id = matches.match_id
+    WHERE matches.season_id = ANY(ARRAY[90]::INTEGER[]) AND
+    matches.competition_id = 11::INTEGER AND xg > 0.0::NUMERIC;
+    """
+
+
+def test_literal_sql_applies_typed_overrides():
+    sql = QUERY.literal_sql(competition_id="2", season_ids=["44", "4"], min_count=5, min_xg=None)
+    assert "matches.season_id = ANY(ARRAY[44, 4]::INTEGER[])" in sql
+    assert "matches.competition_id = 2::INTEGER" in sql
+    # None keeps the default, parameters the query does not take are ignored
+    assert "xg > 0.0::NUMERIC" in sql
+
+
+def test_literal_sql_partitioned_filters_every_partitioned_table():
+    sql = REGISTRY[1].literal_sql(partitioned=True, season_ids=[90, 42])
+    for table in ["events", "shots"]:
+        assert (f"AND {table}.competition_id = 11::INTEGER "
+                f"AND {table}.season_id = ANY(ARRAY[90, 42]::INTEGER[])") in sql
+    assert "passes.competition_id" not in sql
+
+
+# The graded Q_n text is not built from the registry
+def test_queries_keep_the_graded_sql():
+    assert "matches.season_id = 90 AND" in QUERIES[1]
+    assert "shots.statsbomb_xg > 0 AND" in QUERIES[1]
+    assert "matches.season_id IN (90, 42, 4) AND" in QUERIES[3]
+    assert all("::" not in query for query in QUERIES.values())
+
+
+def test_registry_defaults_return_the_q_n_results(statsbomb_data, database):
+    full_load(database, CopyWriter)
+    for i, query in REGISTRY.items():
+        expected = sorted(database.execute(QUERIES[i]).fetchall())
+        assert expected, query.name
+        assert sorted(database.execute(query.sql, query.params()).fetchall()) == expected, query.name
+        assert sorted(database.execute(query.literal_sql()).fetchall()) == expected, query.name
+
+
+def explain(conn, sql):
+    return "\n".join(row[0] for row in conn.execute(f"EXPLAIN {sql}").fetchall())
+
+
+# (competition, season) of every season partition in a plan, with None as
+# the season of a competition's default partition
+def scanned_partitions(plan):
+    return {(int(competition), None if season == "default" else int(season[1:]))
+            for competition, season in re.findall(r"_c(\d+)_(s\d+|default)", plan)}
+
+
+def test_partitioned_queries_only_scan_their_seasons(statsbomb_data, database):
+    full_load(database, CopyWriter, partitioned=True)
+    for i, query in REGISTRY.items():
+        params = query.params()
+        expected = sorted(database.execute(QUERIES[i]).fetchall())
+        assert sorted(database.execute(query.text(True), params).fetchall()) == expected, query.name
+
+        # The Q_n text scans every competition
+        assert len({competition for competition, _ in scanned_partitions(explain(database, QUERIES[i]))}) == 2
+        plan = explain(database, query.literal_sql(True))
+        partitions = scanned_partitions(plan)
+        assert (params["competition_id"], params["season_ids"][0]) in partitions, query.name
+        # Seasons without a partition of their own are in the competition's default
+        assert partitions <= {(params["competition_id"], season) for season in params["season_ids"] + [None]}, \
+            query.name
+        assert not re.search(r"\b(events|shots|passes|dribbles|dribble_past)_default\b", plan), query.name
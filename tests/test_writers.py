@@ -0,0 +1,43 @@
+from decimal import Decimal
+
+import pytest
+
+from conftest import full_load, reset_schema
+from writers import CopyWriter, InsertWriter, float_to_numeric
+
+
+def test_float_to_numeric_keeps_15_significant_digits():
+    assert float_to_numeric(0.0761) == Decimal("0.0761")
+    # 0.1 + 0.2 is 0.30000000000000004 as a float; float8 -> numeric gives 0.3
+    assert float_to_numeric(0.1 + 0.2) == Decimal("0.3")
+    assert float_to_numeric(0.123456789012345678) == Decimal("0.123456789012346")
+    assert float_to_numeric(0.0) == Decimal("0")
+
+
+def test_float_to_numeric_passes_null_through():
+    assert float_to_numeric(None) is None
+
+
+def test_insert_and_copy_store_the_same_rows(statsbomb_data, database):
+    expected = full_load(database, InsertWriter)
+    assert expected["events"] and expected["shots"] and expected["freeze_frames"]
+    # Competition 9 is not whitelisted
+    assert {row[2] for row in expected["matches"]} == {11, 2}
+    for copy_format in ["text", "binary"]:
+        reset_schema(database)
+        # A small batch size makes the COPY writer flush in the middle of files
+        contents = full_load(database, lambda cur, tables: CopyWriter(cur, copy_format, batch_size=7, tables=tables))
+        assert contents == expected, copy_format
+
+
+@pytest.mark.parametrize("copy_format", ["text", "binary"])
+def test_copy_stores_xg_like_insert(database, copy_format):
+    database.execute("CREATE TABLE xg (statsbomb_xg NUMERIC);")
+    values = [0.0761, 0.1 + 0.2, 0.123456789012345678, None]
+    database.cursor().executemany("INSERT INTO xg VALUES (%s);", [(value,) for value in values])
+    writer = CopyWriter(database.cursor(), copy_format, tables={"xg": [("statsbomb_xg", "numeric")]})
+    for value in values:
+        writer.write("xg", (value,))
+    writer.flush()
+    rows = [row[0] for row in database.execute("SELECT statsbomb_xg FROM xg;").fetchall()]
+    assert rows[len(values):] == rows[:len(values)]